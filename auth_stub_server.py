@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Emergent Auth session-data endpoint
+Serves realistic user payloads with configurable latency, jitter, error and timeout rates
+"""
+
+import hashlib
+import random
+import time
+import uuid
+from collections import Counter
+
+from stub_server import (
+    StubConfig,
+    StubCounters,
+    StubHandler,
+    serve_until_interrupted,
+    start_stub_server,
+    stub_arg_parser,
+)
+
+SESSION_DATA_PATH = "/auth/v1/env/oauth/session-data"
+
+class StubStats(StubCounters):
+    """Thread-safe counters describing the traffic the stub has served"""
+
+    def initial(self):
+        return {
+            "connections": 0,
+            "requests": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "by_session_id": Counter(),
+        }
+
+    def connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def started(self, session_id):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.by_session_id[session_id] += 1
+
+    def finished(self, outcome):
+        with self._lock:
+            self.in_flight -= 1
+            if outcome == "error":
+                self.errors += 1
+            elif outcome == "timeout":
+                self.timeouts += 1
+
+def user_payload(session_id):
+    """Session data for a session_id; the same id always maps to the same user"""
+    digest = hashlib.sha256(session_id.encode()).hexdigest()[:12]
+    return {
+        "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"notepilot-stub/{digest}")),
+        "email": f"test.user.stub.{digest}@example.com",
+        "name": f"Stub User {digest[:6]}",
+        "picture": "https://via.placeholder.com/150",
+        # The backend stores this token as-is, so keep it under the test_session prefix
+        "session_token": f"test_session_stub_{uuid.uuid4().hex}",
+    }
+
+class AuthStubHandler(StubHandler):
+    get_routes = {SESSION_DATA_PATH: "session_data"}
+
+    def setup(self):
+        super().setup()
+        self.stats.connected()
+
+    def session_data(self):
+        session_id = self.headers.get("X-Session-ID", "")
+        self.stats.started(session_id)
+        outcome = "ok"
+        try:
+            time.sleep(self.config.delay())
+            roll = random.random()
+            # session_ids starting with "timeout" always hang, for deadline tests
+            if session_id.startswith("timeout") or roll < self.config.timeout_rate:
+                # Hold the connection open past any sane client deadline
+                outcome = "timeout"
+                time.sleep(self.config.hang)
+                self.close_connection = True
+            elif roll < self.config.timeout_rate + self.config.error_rate:
+                outcome = "error"
+                self.send_json(500, {"detail": "Injected upstream error"})
+            elif not session_id or session_id.startswith("invalid"):
+                self.send_json(401, {"detail": "Invalid session_id"})
+            else:
+                self.send_json(200, user_payload(session_id))
+        finally:
+            self.stats.finished(outcome)
+
+def start_stub(host="127.0.0.1", port=0, config=None, verbose=False):
+    """Start the stub on a background thread and return the server
+
+    The bound address is server.server_address; stop it with server.shutdown().
+    """
+    return start_stub_server(AuthStubHandler, StubStats(), host, port, config, verbose)
+
+def parse_args(argv=None):
+    parser = stub_arg_parser("Local Emergent Auth stand-in", port=8090, latency=50.0, jitter=20.0,
+                             latency_help="mean response latency in milliseconds")
+    parser.add_argument("--timeout-rate", type=float, default=0.0,
+                        help="fraction of requests that hang for --hang seconds")
+    parser.add_argument("--hang", type=float, default=30.0,
+                        help="seconds a timed-out request is held open")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    config = StubConfig(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        hang=args.hang,
+    )
+    server = start_stub(args.host, args.port, config, args.verbose)
+    host, port = server.server_address
+    print(f"🔐 Auth stub listening on http://{host}:{port}{SESSION_DATA_PATH}")
+    print(f"   latency {args.latency}±{args.jitter}ms, error rate {args.error_rate}, "
+          f"timeout rate {args.timeout_rate}")
+
+    serve_until_interrupted(server)
@@ -6,11 +6,35 @@ Tests all FastAPI endpoints with comprehensive validation
 
 import requests
 import json
+import base64
+import hashlib
+import hmac
 import sys
 from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
 import uuid
+import os
 import subprocess
 import time
+import argparse
+import contextlib
+import io
+import math
+import re
+import statistics
+import tempfile
+import threading
+import tracemalloc
+import unicodedata
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from xml.etree import ElementTree
 
 # Get backend URL from frontend .env
 def get_backend_url():
@@ -23,19 +47,223 @@ def get_backend_url():
         print(f"Error reading backend URL: {e}")
         return None
 
-BASE_URL = get_backend_url()
-if not BASE_URL:
-    print("❌ Could not get backend URL from frontend/.env")
-    sys.exit(1)
+# Set by resolve_backend_url(); in-process modes (--serialization-bench) never need them
+BASE_URL = None
+API_BASE = None
 
-API_BASE = f"{BASE_URL}/api"
-print(f"🔗 Testing backend at: {API_BASE}")
+def resolve_backend_url():
+    """Point the harness at the backend from frontend/.env, exiting if there is none"""
+    global BASE_URL, API_BASE
+    BASE_URL = get_backend_url()
+    if not BASE_URL:
+        print("❌ Could not get backend URL from frontend/.env")
+        sys.exit(1)
+    
+    API_BASE = f"{BASE_URL}/api"
+    print(f"🔗 Testing backend at: {API_BASE}")
+
+# Read backend settings from the environment, falling back to backend/.env
+def get_backend_settings(defaults):
+    settings = dict(defaults)
+    try:
+        with open('/app/backend/.env', 'r') as f:
+            for line in f:
+                key, sep, value = line.strip().partition('=')
+                if sep and key in settings:
+                    settings[key] = value.strip().strip('"')
+    except OSError:
+        pass
+    return {key: os.environ.get(key, value) for key, value in settings.items()}
+
+def get_mongo_settings():
+    settings = get_backend_settings({"MONGO_URL": "mongodb://localhost:27017", "DB_NAME": "test_database"})
+    return settings["MONGO_URL"], settings["DB_NAME"]
+
+def get_session_signing_key():
+    """The backend's HMAC key for signed session tokens, None when they are disabled"""
+    return get_backend_settings({"SESSION_SIGNING_KEY": None})["SESSION_SIGNING_KEY"] or None
+
+# ============ HTTP CLIENT ============
+
+# (connect, read) seconds applied to any request that doesn't pass its own timeout
+DEFAULT_TIMEOUT = (5, 15)
+GET_RETRY = Retry(
+    total=3,
+    backoff_factor=0.25,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset({"GET", "HEAD"}),
+    raise_on_status=False,
+    # Otherwise urllib3 retries any 429 carrying Retry-After, hiding shed load from the caller
+    respect_retry_after_header=False,
+)
+
+RequestTiming = namedtuple(
+    "RequestTiming",
+    ["method", "path", "status", "connect", "server", "total", "test", "db_round_trips", "phases"],
+)
+
+_connect_clock = threading.local()
+
+class _TimedConnect:
+    """urllib3 connection mixin that adds its connect (and TLS handshake) time to the calling thread"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_clock.seconds = getattr(_connect_clock, "seconds", 0.0) + time.perf_counter() - start
+            _connect_clock.count = getattr(_connect_clock, "count", 0) + 1
+
+class TimedHTTPConnection(_TimedConnect, HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(_TimedConnect, HTTPSConnection):
+    pass
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+class ApiClient:
+    """Keep-alive HTTP client shared by the whole harness
+
+    Each thread gets its own pooled requests.Session. Requests default to
+    DEFAULT_TIMEOUT, GETs retry with backoff, and every request is timed with
+    connect time split from server time (time to response headers).
+    """
+
+    def __init__(self, pool_size=20):
+        self.pool_size = pool_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.timings = []
+        # Off for long runs (--soak) that would otherwise grow timings without bound
+        self.record_timings = True
+        self.connections = 0
+        # session_token cookies set by the backend, claimed by FixtureStore.cleanup()
+        self.issued_sessions = []
+        # Set to a TraceRecorder by --record
+        self.recorder = None
+
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = TimedHTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=GET_RETRY)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            # Cookies are always passed explicitly; never let one test's login leak into another
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            self._local.session = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        _connect_clock.seconds = 0.0
+        _connect_clock.count = 0
+        start = time.perf_counter()
+        response = self.session().request(method, url, **kwargs)
+        total = time.perf_counter() - start
+        
+        connect = _connect_clock.seconds
+        timing = RequestTiming(
+            method,
+            urlparse(url).path,
+            response.status_code,
+            connect,
+            max(0.0, response.elapsed.total_seconds() - connect),
+            total,
+            getattr(self._local, "test", None),
+            db_round_trips(response),
+            parse_server_timing(response.headers["Server-Timing"]) if "Server-Timing" in response.headers else None,
+        )
+        response.timing = timing
+        issued = response.cookies.get("session_token")
+        with self._lock:
+            if self.record_timings:
+                self.timings.append(timing)
+            self.connections += _connect_clock.count
+            if issued:
+                self.issued_sessions.append(issued)
+        if self.recorder and url.startswith(API_BASE):
+            self.recorder.record(method, url, kwargs, response, start)
+        return response
+
+    def take_issued_sessions(self):
+        """Session tokens handed out by the backend since the last call"""
+        with self._lock:
+            tokens, self.issued_sessions = self.issued_sessions, []
+        return tokens
+
+    def label(self, test):
+        """Attribute this thread's following requests to `test` (None to clear)"""
+        self._local.test = test
+
+    def labelled(self, func):
+        """Wrap func to run under this thread's current label, e.g. on a test's own thread pool"""
+        test = getattr(self._local, "test", None)
+        
+        def run(*args, **kwargs):
+            previous = getattr(self._local, "test", None)
+            self._local.test = test
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.test = previous
+        return run
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def summary(self):
+        """One line describing all traffic so far"""
+        with self._lock:
+            timings = list(self.timings)
+            connections = self.connections
+        connect = sum(timing.connect for timing in timings)
+        server = sum(timing.server for timing in timings)
+        return (f"{len(timings)} requests over {connections} connections, "
+                f"connect {connect:.2f}s, server {server:.2f}s")
+
+api = ApiClient()
+
+def route_missing(response, route, action="skipping"):
+    """True, after printing what happens instead, if the backend doesn't serve `route` yet
+
+    FastAPI answers a route it doesn't have with 405, or with 404 and the
+    generic detail "Not Found"; a handler's own 404 says what wasn't found.
+    """
+    if response.status_code == 404:
+        try:
+            generic = response.json().get("detail") == "Not Found"
+        except (ValueError, AttributeError):
+            generic = False
+        if not generic:
+            return False
+    elif response.status_code != 405:
+        return False
+    print(f"   ⚠️  {route} not available on this backend ({response.status_code}), {action}")
+    return True
 
 def test_root_endpoint():
     """Test GET /api/ endpoint"""
     print("\n🧪 Testing GET /api/ (Root endpoint)")
     try:
-        response = requests.get(f"{API_BASE}/")
+        response = api.get(f"{API_BASE}/")
         print(f"   Status Code: {response.status_code}")
         print(f"   Response: {response.text}")
         
@@ -62,7 +290,7 @@ def test_post_status_endpoint():
     test_data = {"client_name": "NotePilot_Test_Client"}
     
     try:
-        response = requests.post(
+        response = api.post(
             f"{API_BASE}/status",
             json=test_data,
             headers={"Content-Type": "application/json"}
@@ -116,7 +344,7 @@ def test_post_status_error_handling():
     
     # Test with missing client_name
     try:
-        response = requests.post(
+        response = api.post(
             f"{API_BASE}/status",
             json={},
             headers={"Content-Type": "application/json"}
@@ -134,7 +362,7 @@ def test_post_status_error_handling():
     
     # Test with invalid JSON
     try:
-        response = requests.post(
+        response = api.post(
             f"{API_BASE}/status",
             data="invalid json",
             headers={"Content-Type": "application/json"}
@@ -157,7 +385,7 @@ def test_get_status_endpoint():
     print("\n🧪 Testing GET /api/status (Get all status checks)")
     
     try:
-        response = requests.get(f"{API_BASE}/status")
+        response = api.get(f"{API_BASE}/status")
         print(f"   Status Code: {response.status_code}")
         print(f"   Response: {response.text}")
         
@@ -193,7 +421,7 @@ def test_get_status_endpoint():
 
 def test_data_persistence():
     """Test that data persists between POST and GET operations"""
-    print("\n🧪 Testing data persistence (POST then GET)")
+    print("\n🧪 Testing data persistence (POST then GET by id)")
     
     # Create a unique client name for this test
     unique_client = f"PersistenceTest_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
@@ -201,7 +429,7 @@ def test_data_persistence():
     # First, POST a new status check
     post_data = {"client_name": unique_client}
     try:
-        post_response = requests.post(
+        post_response = api.post(
             f"{API_BASE}/status",
             json=post_data,
             headers={"Content-Type": "application/json"}
@@ -215,441 +443,3616 @@ def test_data_persistence():
         posted_id = posted_data["id"]
         print(f"   ✅ Posted status check with ID: {posted_id}")
         
-        # Then, GET all status checks and verify our data is there
-        get_response = requests.get(f"{API_BASE}/status")
+        # Then, look the status check up by id
+        get_response = api.get(f"{API_BASE}/status/{posted_id}", timeout=10)
+        if route_missing(get_response, "GET /api/status/{id}", "checking the full list instead"):
+            return status_listed(posted_id, unique_client)
         
         if get_response.status_code != 200:
-            print(f"   ❌ GET failed: {get_response.status_code}")
+            print(f"   ❌ GET by id failed: {get_response.status_code}")
             return False
         
-        all_status_checks = get_response.json()
+        found_item = get_response.json()
         
-        # Find our posted item
-        found_item = None
-        for item in all_status_checks:
-            if item["id"] == posted_id:
-                found_item = item
-                break
+        if found_item.get("id") != posted_id:
+            print(f"   ❌ Lookup returned wrong item: {found_item}")
+            return False
         
-        if found_item:
-            if found_item["client_name"] == unique_client:
-                print("   ✅ Data persisted correctly in MongoDB")
-                return True
-            else:
-                print(f"   ❌ Data corrupted: expected {unique_client}, got {found_item['client_name']}")
-                return False
-        else:
-            print(f"   ❌ Posted item not found in GET response")
+        if found_item["client_name"] != unique_client:
+            print(f"   ❌ Data corrupted: expected {unique_client}, got {found_item['client_name']}")
             return False
+        
+        print("   ✅ Data persisted correctly in MongoDB")
+        
+        missing_response = api.get(f"{API_BASE}/status/{uuid.uuid4()}", timeout=10)
+        if missing_response.status_code != 404:
+            print(f"   ❌ Expected 404 for unknown id, got {missing_response.status_code}")
+            return False
+        
+        print("   ✅ Unknown id returns 404")
+        return True
             
     except Exception as e:
         print(f"   ❌ Error testing persistence: {e}")
         return False
 
-# ============ OAUTH TESTING FUNCTIONS ============
-
-def create_test_user_and_session():
-    """Create test user and session in MongoDB using mongosh"""
-    print("   📝 Creating test user and session in MongoDB...")
+def status_listed(posted_id, client_name):
+    """Persistence check for backends without GET /api/status/{id}: find the item in the list"""
+    get_response = api.get(f"{API_BASE}/status", timeout=10)
+    if get_response.status_code != 200:
+        print(f"   ❌ GET failed: {get_response.status_code}")
+        return False
     
-    timestamp = int(time.time() * 1000)
-    user_id = f"test-user-{timestamp}"
-    session_token = f"test_session_{timestamp}"
-    email = f"test.user.{timestamp}@example.com"
-    
-    # MongoDB command to create test data
-    mongo_cmd = f"""
-    use('test_database');
-    var userId = '{user_id}';
-    var sessionToken = '{session_token}';
-    var email = '{email}';
-    db.users.insertOne({{
-      user_id: userId,
-      email: email,
-      name: 'Test User OAuth',
-      picture: 'https://via.placeholder.com/150',
-      created_at: new Date()
-    }});
-    db.user_sessions.insertOne({{
-      user_id: userId,
-      session_token: sessionToken,
-      expires_at: new Date(Date.now() + 7*24*60*60*1000),
-      created_at: new Date()
-    }});
-    print('SUCCESS: Created user and session');
-    """
+    found_item = next((item for item in get_response.json() if item.get("id") == posted_id), None)
+    if not found_item:
+        print("   ❌ Posted data not found in GET response")
+        return False
+    if found_item["client_name"] != client_name:
+        print(f"   ❌ Data corrupted: expected {client_name}, got {found_item['client_name']}")
+        return False
     
-    try:
-        result = subprocess.run(
-            ['mongosh', '--eval', mongo_cmd],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        if result.returncode == 0 and 'SUCCESS' in result.stdout:
-            print(f"   ✅ Created test user: {user_id}")
-            print(f"   ✅ Created session token: {session_token}")
-            return user_id, session_token, email
-        else:
-            print(f"   ❌ MongoDB command failed: {result.stderr}")
-            return None, None, None
-            
-    except Exception as e:
-        print(f"   ❌ Error creating test data: {e}")
-        return None, None, None
+    print("   ✅ Data persisted correctly in MongoDB (found in the full list)")
+    return True
 
-def cleanup_test_data():
-    """Clean up test data from MongoDB"""
-    print("   🧹 Cleaning up test data...")
+# Server-side cap on GET /api/status pages, applied when no limit is given
+STATUS_MAX_PAGE_SIZE = 100
+
+def test_status_pagination():
+    """Test keyset pagination of GET /api/status"""
+    print("\n🧪 Testing GET /api/status pagination (limit/after)")
     
-    mongo_cmd = """
-    use('test_database');
-    db.users.deleteMany({email: /test\\.user\\./});
-    db.user_sessions.deleteMany({session_token: /test_session/});
-    print('CLEANUP: Test data removed');
-    """
+    page_size = 2
+    client_name = f"PaginationTest_{uuid.uuid4().hex[:8]}"
     
     try:
-        result = subprocess.run(
-            ['mongosh', '--eval', mongo_cmd],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        # Make sure there is more than one page to walk
+        for _ in range(page_size + 1):
+            post_response = api.post(
+                f"{API_BASE}/status",
+                json={"client_name": client_name},
+                timeout=10
+            )
+            if post_response.status_code != 200:
+                print(f"   ❌ POST failed: {post_response.status_code}")
+                return False
         
-        if result.returncode == 0:
-            print("   ✅ Test data cleaned up")
-        else:
-            print(f"   ⚠️  Cleanup warning: {result.stderr}")
+        probe = api.get(f"{API_BASE}/status", params={"limit": page_size}, timeout=10)
+        if (probe.status_code == 200 and len(probe.json()) > page_size
+                and "X-Next-Cursor" not in probe.headers):
+            print("   ⚠️  GET /api/status ignores limit and sends no cursor; pagination not "
+                  "available on this backend, skipping")
+            return True
+        
+        default_response = api.get(f"{API_BASE}/status", timeout=10)
+        if default_response.status_code != 200:
+            print(f"   ❌ GET failed: {default_response.status_code}")
+            return False
+        
+        default_page = default_response.json()
+        if len(default_page) > STATUS_MAX_PAGE_SIZE:
+            print(f"   ❌ Unbounded response: {len(default_page)} items > {STATUS_MAX_PAGE_SIZE}")
+            return False
+        
+        print(f"   ✅ Default page bounded ({len(default_page)} items, "
+              f"{len(default_response.content)} bytes)")
+        
+        seen_ids = set()
+        last_key = None
+        after = None
+        pages = 0
+        
+        while pages < 3:
+            params = {"limit": page_size}
+            if after:
+                params["after"] = after
+            response = api.get(f"{API_BASE}/status", params=params, timeout=10)
+            
+            if response.status_code != 200:
+                print(f"   ❌ Page {pages + 1} failed: {response.status_code}")
+                return False
+            
+            page = response.json()
+            pages += 1
+            
+            if len(page) > page_size:
+                print(f"   ❌ Page {pages} has {len(page)} items, limit was {page_size}")
+                return False
+            
+            for item in page:
+                if item["id"] in seen_ids:
+                    print(f"   ❌ Item {item['id']} returned on more than one page")
+                    return False
+                seen_ids.add(item["id"])
+                
+                key = (item["timestamp"], item["id"])
+                if last_key and key > last_key:
+                    print(f"   ❌ Items out of order: {key} after {last_key}")
+                    return False
+                last_key = key
+            
+            after = response.headers.get("X-Next-Cursor")
+            if not after:
+                break
+        
+        if pages < 2:
+            print(f"   ❌ Expected a next cursor after {page_size} of {page_size + 1}+ items")
+            return False
+        
+        print(f"   ✅ Walked {pages} pages of {page_size} with no duplicates, newest first")
+        return True
             
     except Exception as e:
-        print(f"   ⚠️  Cleanup error: {e}")
+        print(f"   ❌ Error testing pagination: {e}")
+        return False
 
-def test_oauth_session_exchange():
-    """Test POST /api/auth/session endpoint"""
-    print("\n🧪 Testing POST /api/auth/session (Session Exchange)")
-    
-    # This endpoint requires a valid session_id from Emergent Auth
-    # Since we can't get a real session_id in testing, we test the endpoint structure
-    # and error handling
-    
-    test_data = {"session_id": "invalid_test_session_id"}
+def test_status_ndjson_stream():
+    """Test the NDJSON streaming variant of GET /api/status"""
+    print("\n🧪 Testing GET /api/status NDJSON stream")
     
     try:
-        response = requests.post(
-            f"{API_BASE}/auth/session",
-            json=test_data,
-            headers={"Content-Type": "application/json"},
+        response = api.get(
+            f"{API_BASE}/status",
+            params={"limit": 10},
+            headers={"Accept": "application/x-ndjson"},
+            stream=True,
             timeout=10
         )
-        
         print(f"   Status Code: {response.status_code}")
-        print(f"   Response: {response.text}")
         
-        # We expect this to fail since we're using an invalid session_id
-        # The endpoint should handle the error gracefully
-        if response.status_code in [401, 500, 520]:  # Accept various error codes
-            try:
-                error_data = response.json()
-                if "detail" in error_data:
-                    print("   ✅ Session exchange endpoint structure correct")
-                    print("   ✅ Properly handles invalid session_id (expected behavior)")
-                    return True
-                else:
-                    print("   ❌ Error response missing 'detail' field")
-                    return False
-            except:
-                print("   ❌ Error response not valid JSON")
-                return False
-        elif response.status_code == 504:
-            print("   ✅ Auth service timeout handled correctly")
+        if response.status_code != 200:
+            print(f"   ❌ Failed with status {response.status_code}")
+            return False
+        
+        content_type = response.headers.get("Content-Type", "")
+        if content_type.startswith("application/json"):
+            response.close()
+            print("   ⚠️  GET /api/status ignores Accept: application/x-ndjson; streaming not "
+                  "available on this backend, skipping")
             return True
-        else:
-            print(f"   ❌ Unexpected status code: {response.status_code}")
+        if not content_type.startswith("application/x-ndjson"):
+            print(f"   ❌ Unexpected Content-Type: {content_type}")
+            return False
+        
+        count = 0
+        for line in response.iter_lines():
+            if not line:
+                continue
+            item = json.loads(line)
+            missing_fields = [field for field in ["id", "client_name", "timestamp"] if field not in item]
+            if missing_fields:
+                print(f"   ❌ Streamed item missing fields: {missing_fields}")
+                return False
+            count += 1
+        
+        if count > 10:
+            print(f"   ❌ Stream ignored limit: {count} items")
             return False
+        
+        print(f"   ✅ Streamed {count} items as NDJSON")
+        return True
             
     except Exception as e:
-        print(f"   ❌ Error: {e}")
+        print(f"   ❌ Error testing NDJSON stream: {e}")
         return False
 
-def test_oauth_auth_me():
-    """Test GET /api/auth/me endpoint"""
-    print("\n🧪 Testing GET /api/auth/me (Auth Verification)")
-    
-    # Create test user and session
-    user_id, session_token, email = create_test_user_and_session()
+def test_status_batch_insert():
+    """Test POST /api/status/batch"""
+    print("\n🧪 Testing POST /api/status/batch (Bulk create status checks)")
     
-    if not session_token:
-        print("   ❌ Failed to create test data")
-        return False
+    client_name = f"BatchTest_{uuid.uuid4().hex[:8]}"
+    batch = [{"client_name": f"{client_name}_{i}"} for i in range(5)]
     
     try:
-        # Test 1: Authorization header method
-        print("   🔍 Testing Authorization header method...")
-        response = requests.get(
-            f"{API_BASE}/auth/me",
-            headers={"Authorization": f"Bearer {session_token}"},
-            timeout=10
-        )
-        
+        response = api.post(f"{API_BASE}/status/batch", json=batch)
         print(f"   Status Code: {response.status_code}")
-        print(f"   Response: {response.text}")
+        if route_missing(response, "POST /api/status/batch"):
+            return True
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Validate response structure
-            required_fields = ["user_id", "email", "name", "created_at"]
-            missing_fields = [field for field in required_fields if field not in data]
-            
-            if missing_fields:
-                print(f"   ❌ Missing fields in response: {missing_fields}")
-                cleanup_test_data()
-                return False
-            
-            # Validate field values
-            if data["user_id"] != user_id:
-                print(f"   ❌ User ID mismatch: expected {user_id}, got {data['user_id']}")
-                cleanup_test_data()
-                return False
-            
-            if data["email"] != email:
-                print(f"   ❌ Email mismatch: expected {email}, got {data['email']}")
-                cleanup_test_data()
-                return False
-            
-            print("   ✅ Authorization header authentication working")
-            
-            # Test 2: Cookie method
-            print("   🔍 Testing cookie method...")
-            cookie_response = requests.get(
-                f"{API_BASE}/auth/me",
-                cookies={"session_token": session_token},
-                timeout=10
-            )
-            
-            if cookie_response.status_code == 200:
-                cookie_data = cookie_response.json()
-                if cookie_data["user_id"] == user_id:
-                    print("   ✅ Cookie authentication working")
-                    cleanup_test_data()
-                    return True
-                else:
-                    print("   ❌ Cookie auth returned wrong user")
-                    cleanup_test_data()
-                    return False
-            else:
-                print(f"   ❌ Cookie auth failed: {cookie_response.status_code}")
-                cleanup_test_data()
+        if response.status_code != 200:
+            print(f"   ❌ Failed with status {response.status_code}: {response.text}")
+            return False
+        
+        created = response.json()
+        if [item.get("client_name") for item in created] != [item["client_name"] for item in batch]:
+            print(f"   ❌ Response does not match the batch in order: {created}")
+            return False
+        
+        ids = {item["id"] for item in created}
+        if len(ids) != len(batch):
+            print("   ❌ Batch items did not get distinct ids")
+            return False
+        
+        print(f"   ✅ Created {len(created)} status checks in one request")
+        
+        for item in created:
+            lookup = api.get(f"{API_BASE}/status/{item['id']}")
+            if lookup.status_code != 200:
+                print(f"   ❌ Batch item {item['id']} not persisted: {lookup.status_code}")
                 return False
-                
-        else:
-            print(f"   ❌ Auth verification failed: {response.status_code}")
-            cleanup_test_data()
+        
+        print("   ✅ Every batch item persisted")
+        
+        # A single invalid item must reject the whole batch
+        invalid_response = api.post(
+            f"{API_BASE}/status/batch",
+            json=[{"client_name": f"{client_name}_rejected"}, {}]
+        )
+        if invalid_response.status_code != 422:
+            print(f"   ❌ Expected 422 for an invalid item, got {invalid_response.status_code}")
             return False
+        
+        # Looked up by name: concurrent tests may push it out of any page of the API
+        rejected = get_fixture_store().db.status_checks.count_documents({"client_name": f"{client_name}_rejected"})
+        if rejected:
+            print(f"   ❌ Invalid batch was partially written ({rejected} items stored)")
+            return False
+        
+        print("   ✅ Invalid batch rejected without partial writes")
+        return True
             
     except Exception as e:
         print(f"   ❌ Error: {e}")
-        cleanup_test_data()
         return False
 
-def test_oauth_logout():
-    """Test POST /api/auth/logout endpoint"""
-    print("\n🧪 Testing POST /api/auth/logout (Logout)")
-    
-    # Create test user and session
-    user_id, session_token, email = create_test_user_and_session()
+# Bucket sizes accepted by GET /api/status/stats, in seconds
+STATUS_STATS_BUCKETS = {"minute": 60, "hour": 3600, "day": 86400}
+
+def test_status_stats():
+    """Test GET /api/status/stats per-client counts over time buckets"""
+    print("\n🧪 Testing GET /api/status/stats (Bucketed counts)")
     
-    if not session_token:
-        print("   ❌ Failed to create test data")
-        return False
+    client_name = f"StatsTest_{uuid.uuid4().hex[:8]}"
+    posts = 4
+    window_start = datetime.now(timezone.utc) - timedelta(minutes=5)
     
     try:
-        # First verify the session exists
-        auth_response = requests.get(
-            f"{API_BASE}/auth/me",
-            headers={"Authorization": f"Bearer {session_token}"},
-            timeout=10
+        for _ in range(posts):
+            post_response = api.post(f"{API_BASE}/status", json={"client_name": client_name})
+            if post_response.status_code != 200:
+                print(f"   ❌ POST failed: {post_response.status_code}")
+                return False
+        
+        window_end = datetime.now(timezone.utc) + timedelta(minutes=1)
+        response = api.get(
+            f"{API_BASE}/status/stats",
+            params={
+                "client_name": client_name,
+                "from": window_start.isoformat(),
+                "to": window_end.isoformat(),
+                "bucket": "minute",
+            }
         )
+        print(f"   Status Code: {response.status_code}")
+        print(f"   Response: {response.text}")
+        if route_missing(response, "GET /api/status/stats"):
+            return True
         
-        if auth_response.status_code != 200:
-            print("   ❌ Test session not working before logout test")
-            cleanup_test_data()
+        if response.status_code != 200:
+            print(f"   ❌ Failed with status {response.status_code}")
             return False
         
-        print("   ✅ Test session verified before logout")
+        buckets = response.json().get("buckets", [])
+        total = sum(bucket["count"] for bucket in buckets)
+        if total != posts:
+            print(f"   ❌ Expected {posts} checks for {client_name}, counted {total}")
+            return False
         
-        # Test logout
-        logout_response = requests.post(
-            f"{API_BASE}/auth/logout",
-            headers={"Authorization": f"Bearer {session_token}"},
-            timeout=10
-        )
+        starts = [datetime.fromisoformat(bucket["start"].replace('Z', '+00:00')) for bucket in buckets]
+        if any(start.second or start.microsecond for start in starts) or starts != sorted(starts):
+            print(f"   ❌ Buckets not aligned to minutes in ascending order: {starts}")
+            return False
         
-        print(f"   Logout Status Code: {logout_response.status_code}")
-        print(f"   Logout Response: {logout_response.text}")
+        # The answer is bounded by the window, never by how many checks exist
+        max_buckets = math.ceil((window_end - window_start).total_seconds() / STATUS_STATS_BUCKETS["minute"]) + 1
+        if len(buckets) > max_buckets:
+            print(f"   ❌ {len(buckets)} buckets, the window only spans {max_buckets}")
+            return False
         
-        if logout_response.status_code == 200:
-            logout_data = logout_response.json()
+        print(f"   ✅ {total} checks counted across {len(buckets)} minute buckets")
+        
+        round_trips = db_round_trips(response)
+        if round_trips != 1:
+            print(f"   ❌ Expected a single bucket query, got {round_trips} round trips")
+            return False
+        
+        print("   ✅ Answered from the buckets in one query")
+        
+        # Same valid window, so only the bucket can be what is rejected
+        invalid_response = api.get(
+            f"{API_BASE}/status/stats",
+            params={
+                "client_name": client_name,
+                "from": window_start.isoformat(),
+                "to": window_end.isoformat(),
+                "bucket": "fortnight",
+            }
+        )
+        if invalid_response.status_code != 422:
+            print(f"   ❌ Expected 422 for an unknown bucket, got {invalid_response.status_code}")
+            return False
+        
+        print("   ✅ Unknown bucket size rejected")
+        return True
             
-            if "message" in logout_data and "Logged out" in logout_data["message"]:
-                print("   ✅ Logout endpoint returns correct message")
-                
-                # Verify session is deleted - should get 401 now
-                verify_response = requests.get(
-                    f"{API_BASE}/auth/me",
-                    headers={"Authorization": f"Bearer {session_token}"},
-                    timeout=10
-                )
-                
-                if verify_response.status_code == 401:
-                    print("   ✅ Session properly deleted from database")
-                    cleanup_test_data()
-                    return True
-                else:
-                    print(f"   ❌ Session still valid after logout: {verify_response.status_code}")
-                    cleanup_test_data()
-                    return False
-            else:
-                print(f"   ❌ Unexpected logout response: {logout_data}")
-                cleanup_test_data()
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        return False
+
+def revalidate(url, etag, **kwargs):
+    """GET url with If-None-Match: etag"""
+    headers = dict(kwargs.pop("headers", {}), **{"If-None-Match": etag})
+    return api.get(url, headers=headers, timeout=10, **kwargs)
+
+def check_not_modified(full, conditional):
+    """Print why a revalidation is not a proper 304, or the bytes it saved; True if proper"""
+    if conditional.status_code != 304:
+        print(f"   ❌ Expected 304 for a matching If-None-Match, got {conditional.status_code}")
+        return False
+    if conditional.content:
+        print(f"   ❌ 304 response carried a {len(conditional.content)}-byte body")
+        return False
+    if conditional.headers.get("ETag") != full.headers["ETag"]:
+        print(f"   ❌ 304 ETag {conditional.headers.get('ETag')} differs from {full.headers['ETag']}")
+        return False
+    print(f"   ✅ 304 Not Modified with an empty body, {len(full.content)} bytes saved")
+    return True
+
+def etags_missing(response, route):
+    """True, after printing that the check is skipped, if `route` sends no ETag at all yet"""
+    if response.status_code == 200 and "ETag" not in response.headers:
+        print(f"   ⚠️  {route} sends no ETag on this backend, skipping")
+        return True
+    return False
+
+def strong_etag(response):
+    """The response's strong ETag, or None (after printing why) if it has none"""
+    etag = response.headers.get("ETag")
+    if not etag:
+        print("   ❌ Response has no ETag")
+        return None
+    if etag.startswith("W/"):
+        print(f"   ❌ Expected a strong ETag, got {etag}")
+        return None
+    return etag
+
+def test_status_conditional_get():
+    """Test ETag / If-None-Match on GET /api/status"""
+    print("\n🧪 Testing conditional GET /api/status (ETag / 304)")
+    
+    try:
+        # Other tests may write between the two requests; a changed list is a fresh ETag, not a miss
+        for attempt in range(3):
+            full = api.get(f"{API_BASE}/status", timeout=10)
+            if full.status_code != 200:
+                print(f"   ❌ GET /api/status failed: {full.status_code}")
                 return False
-        else:
-            print(f"   ❌ Logout failed: {logout_response.status_code}")
-            cleanup_test_data()
+            if etags_missing(full, "GET /api/status"):
+                return True
+            etag = strong_etag(full)
+            if not etag:
+                return False
+            conditional = revalidate(f"{API_BASE}/status", etag)
+            if conditional.status_code != 200 or conditional.headers.get("ETag") == etag:
+                break
+        
+        if not check_not_modified(full, conditional):
+            return False
+        
+        round_trips = db_round_trips(conditional)
+        if round_trips is None:
+            print(f"   ❌ 304 has no {DB_ROUND_TRIPS_HEADER} header")
+            return False
+        if round_trips > 1:
+            print(f"   ❌ 304 took {round_trips} DB round trips; the ETag should come from a counter")
+            return False
+        
+        print(f"   ✅ 304 answered with {round_trips} DB round trips")
+        
+        post_response = api.post(f"{API_BASE}/status", json={"client_name": f"test_etag_{uuid.uuid4().hex[:8]}"})
+        if post_response.status_code != 200:
+            print(f"   ❌ POST /api/status failed: {post_response.status_code}")
             return False
+        
+        changed = revalidate(f"{API_BASE}/status", etag)
+        if changed.status_code != 200 or changed.headers.get("ETag") == etag:
+            print(f"   ❌ Stale ETag still matched after a write: {changed.status_code}")
+            return False
+        
+        print("   ✅ A write changes the ETag and the list is sent again")
+        return True
             
     except Exception as e:
         print(f"   ❌ Error: {e}")
-        cleanup_test_data()
         return False
 
-def test_oauth_error_scenarios():
-    """Test OAuth error handling scenarios"""
-    print("\n🧪 Testing OAuth Error Scenarios")
+HEALTH_CHECKS = ("mongo", "pool", "auth_upstream")
+# Orchestrator-style polling during the load phase of the health test: many
+# replicas' probes, each polling every HEALTH_POLL_INTERVAL seconds
+HEALTH_POLLERS = 16
+HEALTH_POLL_INTERVAL = 0.05
+HEALTH_LOAD_DURATION = 3.0
+# Well inside the 1s timeout an orchestrator gives each probe
+HEALTH_P95_BOUND_MS = 250.0
+
+def test_health_probes():
+    """Test /api/health liveness and readiness are served from a cached background probe"""
+    print("\n🧪 Testing GET /api/health/live and /api/health/ready")
     
     try:
-        # Test 1: No authentication
-        print("   🔍 Testing no authentication...")
-        no_auth_response = requests.get(f"{API_BASE}/auth/me", timeout=10)
+        live = api.get(f"{API_BASE}/health/live", timeout=10)
+        if route_missing(live, "GET /api/health/live"):
+            return True
+        if live.status_code != 200:
+            print(f"   ❌ Liveness failed: {live.status_code}")
+            return False
+        if db_round_trips(live) is None:
+            print(f"   ❌ Liveness has no {DB_ROUND_TRIPS_HEADER} header")
+            return False
+        if db_round_trips(live):
+            print(f"   ❌ Liveness hit the DB ({db_round_trips(live)} round trips)")
+            return False
         
-        if no_auth_response.status_code == 401:
-            print("   ✅ Correctly returns 401 for no authentication")
-        else:
-            print(f"   ❌ Expected 401, got {no_auth_response.status_code}")
+        print("   ✅ Liveness answers without touching the DB")
+        
+        ready = api.get(f"{API_BASE}/health/ready", timeout=10)
+        report = ready.json()
+        checks = report.get("checks", {})
+        missing = [name for name in HEALTH_CHECKS if name not in checks]
+        if missing:
+            print(f"   ❌ Readiness report missing checks: {missing}")
+            return False
+        if ready.status_code != 200:
+            failing = {name: check for name, check in checks.items() if not check.get("ok")}
+            print(f"   ❌ Backend not ready ({ready.status_code}): {failing}")
+            return False
+        if AUTH_STUB_URL and not checks["auth_upstream"].get("ok"):
+            print(f"   ❌ Auth upstream reported unreachable: {checks['auth_upstream']}")
             return False
         
-        # Test 2: Invalid session token
-        print("   🔍 Testing invalid session token...")
-        invalid_response = requests.get(
-            f"{API_BASE}/auth/me",
-            headers={"Authorization": "Bearer invalid_token_12345"},
-            timeout=10
-        )
+        interval = report.get("interval_seconds")
+        try:
+            checked_at = datetime.fromisoformat(report["checked_at"].replace('Z', '+00:00'))
+        except (KeyError, AttributeError, ValueError):
+            print(f"   ❌ Readiness report has no valid checked_at: {report.get('checked_at')!r}")
+            return False
+        if checked_at.tzinfo is None:
+            # Mongo-style naive timestamps are UTC
+            checked_at = checked_at.replace(tzinfo=timezone.utc)
+        age = (datetime.now(timezone.utc) - checked_at).total_seconds()
+        if not interval or age > 2 * interval + 1:
+            print(f"   ❌ Probe result is {age:.1f}s old with a {interval}s refresh interval")
+            return False
         
-        if invalid_response.status_code == 401:
-            print("   ✅ Correctly returns 401 for invalid token")
-        else:
-            print(f"   ❌ Expected 401 for invalid token, got {invalid_response.status_code}")
+        print(f"   ✅ Ready: mongo {checks['mongo'].get('latency_ms')}ms, "
+              f"pool saturation {checks['pool'].get('saturation')}, probe {age:.1f}s old")
+        
+        # Orchestrator polling on top of real traffic
+        deadline = time.perf_counter() + HEALTH_LOAD_DURATION
+        
+        def poll():
+            samples = []
+            while time.perf_counter() < deadline:
+                response = api.get(f"{API_BASE}/health/ready", timeout=10)
+                samples.append((response.status_code, response.timing.total * 1000,
+                                db_round_trips(response), response.json().get("checked_at")))
+                time.sleep(HEALTH_POLL_INTERVAL)
+            return samples
+        
+        def traffic():
+            while time.perf_counter() < deadline:
+                api.get(f"{API_BASE}/status", params={"limit": STATUS_MAX_PAGE_SIZE}, timeout=10)
+        
+        with ThreadPoolExecutor(max_workers=HEALTH_POLLERS + 4) as pool:
+            loaders = [pool.submit(api.labelled(traffic)) for _ in range(4)]
+            polls = [sample for future in [pool.submit(api.labelled(poll)) for _ in range(HEALTH_POLLERS)]
+                     for sample in future.result()]
+            for future in loaders:
+                future.result()
+        
+        statuses = Counter(status for status, _, _, _ in polls)
+        p95 = percentile(sorted(ms for _, ms, _, _ in polls), 95)
+        if any(trips is None for _, _, trips, _ in polls):
+            print(f"   ❌ Readiness polls without a {DB_ROUND_TRIPS_HEADER} header")
             return False
+        trips = sum(trips for _, _, trips, _ in polls)
+        refreshes = len({stamp for _, _, _, stamp in polls})
+        print(f"   {len(polls)} readiness polls: {dict(statuses)}, p95 {p95:.1f}ms, "
+              f"{trips} DB round trips, {refreshes} distinct probe results")
         
-        # Test 3: Expired session (create and immediately expire)
-        print("   🔍 Testing expired session...")
+        if set(statuses) != {200}:
+            print("   ❌ Readiness flapped under load")
+            return False
+        if trips:
+            print("   ❌ Readiness polls reached the DB; they must read the cached probe")
+            return False
+        if refreshes > HEALTH_LOAD_DURATION / interval + 2:
+            print(f"   ❌ Probe ran {refreshes} times in {HEALTH_LOAD_DURATION}s, more often than every {interval}s")
+            return False
+        if p95 > HEALTH_P95_BOUND_MS:
+            print(f"   ❌ Readiness p95 {p95:.1f}ms over the {HEALTH_P95_BOUND_MS:.0f}ms bound")
+            return False
         
-        timestamp = int(time.time() * 1000)
-        expired_user_id = f"expired-user-{timestamp}"
-        expired_session_token = f"expired_session_{timestamp}"
-        
-        # Create session that's already expired
-        mongo_cmd = f"""
-        use('test_database');
-        var userId = '{expired_user_id}';
-        var sessionToken = '{expired_session_token}';
-        db.users.insertOne({{
-          user_id: userId,
-          email: 'expired.{timestamp}@example.com',
-          name: 'Expired User',
-          created_at: new Date()
-        }});
-        db.user_sessions.insertOne({{
-          user_id: userId,
-          session_token: sessionToken,
-          expires_at: new Date(Date.now() - 1000),  // Expired 1 second ago
-          created_at: new Date()
-        }});
-        """
-        
-        subprocess.run(['mongosh', '--eval', mongo_cmd], capture_output=True, timeout=30)
-        
-        expired_response = requests.get(
-            f"{API_BASE}/auth/me",
-            headers={"Authorization": f"Bearer {expired_session_token}"},
-            timeout=10
-        )
+        print("   ✅ Readiness stayed fast, cached and DB-free under load")
+        return True
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        return False
+
+# Set with --generator-stub when the backend's study pack generator is study_generator_stub.py
+GENERATOR_STUB_URL = None
+
+STUDY_PACK_OPTIONS = {"summary": True, "key_terms": 5, "flashcards": 3, "quiz": 2}
+# Students submitting the same notes at once, and distinct notes for the worker-pool check
+STUDY_PACK_CLIENTS = 20
+STUDY_PACK_DISTINCT = 12
+STUDY_PACK_TIMEOUT = 60
+
+def study_pack_key(text, options):
+    """Content hash the backend keys a study pack on: normalized text plus canonical options"""
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    canonical = json.dumps(options, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{normalized}\0{canonical}".encode()).hexdigest()
+
+def submit_study_pack(text, options=STUDY_PACK_OPTIONS):
+    return api.post(f"{API_BASE}/study-packs", json={"text": text, "options": options}, timeout=30)
+
+def wait_for_study_pack(job_id, timeout=STUDY_PACK_TIMEOUT):
+    """Poll a study pack job until it settles, returning its final status document or None"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        job = api.get(f"{API_BASE}/study-packs/{job_id}", timeout=10).json()
+        if job.get("status") in ("done", "failed"):
+            return job
+        time.sleep(0.2)
+    return None
+
+def get_study_pack_stats():
+    return api.get(f"{API_BASE}/study-packs/stats", timeout=10).json()
+
+def get_generator_stats():
+    return api.get(f"{GENERATOR_STUB_URL}/stats", timeout=10).json()
+
+def lecture_notes(topic):
+    return (f"Lecture notes on {topic}. Photosynthesis converts light energy into chemical energy. "
+            f"Chlorophyll absorbs light in the chloroplasts. The Calvin cycle fixes carbon dioxide "
+            f"into glucose. Respiration releases the stored energy again.")
+
+def test_study_pack_generation():
+    """Test study pack generation is deduplicated, bounded and cached by content hash"""
+    print("\n🧪 Testing study pack generation (dedup, worker pool, result cache)")
+    
+    try:
+        if GENERATOR_STUB_URL:
+            api.post(f"{GENERATOR_STUB_URL}/stats/reset", timeout=10)
         
-        if expired_response.status_code == 401:
-            print("   ✅ Correctly handles expired session")
-            cleanup_test_data()  # This will clean up the expired session too
+        text = lecture_notes(uuid.uuid4().hex)
+        key = study_pack_key(text, STUDY_PACK_OPTIONS)
+        # Same notes re-uploaded with different whitespace must land on the same job
+        variants = [text, f"  {text.replace(' ', '  ')}\n", text.replace(". ", ".\n")]
+        with ThreadPoolExecutor(max_workers=STUDY_PACK_CLIENTS) as pool:
+            responses = list(pool.map(api.labelled(submit_study_pack),
+                                      [variants[i % len(variants)] for i in range(STUDY_PACK_CLIENTS)]))
+        
+        if route_missing(responses[0], "POST /api/study-packs"):
             return True
-        else:
-            print(f"   ❌ Expected 401 for expired session, got {expired_response.status_code}")
-            cleanup_test_data()
+        
+        statuses = Counter(response.status_code for response in responses)
+        job_ids = {response.json().get("job_id") for response in responses if response.status_code in (200, 202)}
+        print(f"   {STUDY_PACK_CLIENTS} identical submissions: {dict(statuses)}, jobs {len(job_ids)}")
+        
+        if set(statuses) - {200, 202}:
+            print("   ❌ Submission failed")
+            return False
+        if job_ids != {key}:
+            print(f"   ❌ Expected one job keyed {key[:12]}…, got {[job_id[:12] for job_id in job_ids if job_id]}")
+            return False
+        
+        print("   ✅ Identical notes share one content-addressed job")
+        
+        job = wait_for_study_pack(key)
+        if not job or job["status"] != "done":
+            print(f"   ❌ Job did not complete: {job}")
+            return False
+        missing = [section for section in ("summary", "key_terms", "flashcards", "quiz")
+                   if not job.get("result", {}).get(section)]
+        if missing:
+            print(f"   ❌ Study pack missing sections: {missing}")
+            return False
+        
+        print("   ✅ Study pack generated with every requested section")
+        
+        if GENERATOR_STUB_URL:
+            generations = get_generator_stats()["generations"]
+            if generations != 1:
+                print(f"   ❌ {STUDY_PACK_CLIENTS} identical submissions ran {generations} generations")
+                return False
+            print("   ✅ Generator called once for all submissions")
+        
+        cached = submit_study_pack(text)
+        if cached.status_code != 200 or cached.json().get("status") != "done" or not cached.json().get("result"):
+            print(f"   ❌ Resubmission not served from the result cache: {cached.status_code}")
+            return False
+        
+        print(f"   ✅ Resubmission served from cache in {cached.timing.total * 1000:.1f}ms")
+        
+        other = submit_study_pack(text, dict(STUDY_PACK_OPTIONS, quiz=STUDY_PACK_OPTIONS["quiz"] + 1))
+        if other.json().get("job_id") == key:
+            print("   ❌ Different options reused the same job")
+            return False
+        
+        print("   ✅ Options are part of the content hash")
+        
+        distinct = [lecture_notes(uuid.uuid4().hex) for _ in range(STUDY_PACK_DISTINCT)]
+        with ThreadPoolExecutor(max_workers=STUDY_PACK_DISTINCT) as pool:
+            job_ids = [response.json().get("job_id") for response in pool.map(api.labelled(submit_study_pack), distinct)]
+            jobs = list(pool.map(api.labelled(wait_for_study_pack), job_ids + [other.json().get("job_id")]))
+        if not all(job and job["status"] == "done" for job in jobs):
+            print(f"   ❌ {sum(1 for job in jobs if not job or job['status'] != 'done')} jobs did not complete")
+            return False
+        
+        stats = get_study_pack_stats()
+        peak = get_generator_stats()["max_in_flight"] if GENERATOR_STUB_URL else stats["max_running"]
+        print(f"   {len(jobs)} distinct jobs: peak {peak} concurrent generations, {stats['workers']} workers, "
+              f"cache {stats['cache_size']}/{stats['cache_capacity']} ({stats['evictions']} evictions)")
+        
+        if peak > stats["workers"]:
+            print("   ❌ Concurrent generations exceeded the worker pool")
+            return False
+        if stats["cache_size"] > stats["cache_capacity"]:
+            print("   ❌ Result cache grew past its capacity")
             return False
+        
+        print("   ✅ Generations bounded by the worker pool and the cache by its capacity")
+        return True
             
     except Exception as e:
-        print(f"   ❌ Error testing error scenarios: {e}")
-        cleanup_test_data()
+        print(f"   ❌ Error: {e}")
         return False
 
-def run_all_tests():
-    """Run all backend tests"""
-    print("🚀 Starting NotePilot Backend API Tests")
-    print("=" * 50)
-    
-    tests = [
-        ("Root Endpoint", test_root_endpoint),
-        ("POST Status Endpoint", test_post_status_endpoint),
-        ("POST Status Error Handling", test_post_status_error_handling),
-        ("GET Status Endpoint", test_get_status_endpoint),
-        ("Data Persistence", test_data_persistence),
-        ("OAuth - Session Exchange", test_oauth_session_exchange),
-        ("OAuth - Auth Me Endpoint", test_oauth_auth_me),
-        ("OAuth - Logout Endpoint", test_oauth_logout),
-        ("OAuth - Error Scenarios", test_oauth_error_scenarios)
-    ]
-    
-    results = {}
-    
-    for test_name, test_func in tests:
-        try:
-            results[test_name] = test_func()
-        except Exception as e:
-            print(f"   ❌ Test {test_name} crashed: {e}")
-            results[test_name] = False
-    
-    print("\n" + "=" * 50)
-    print("📊 TEST RESULTS SUMMARY")
-    print("=" * 50)
-    
-    passed = 0
-    total = len(tests)
-    
-    for test_name, result in results.items():
-        status = "✅ PASS" if result else "❌ FAIL"
-        print(f"{status} - {test_name}")
-        if result:
-            passed += 1
+# Concurrent chat streams to try, in order; the run reports the highest level that held up
+CHAT_STREAM_LEVELS = (25, 50, 100, 200)
+CHAT_MIN_STREAMS = 100
+# Under concurrency, p95 time-to-first-token may reach this multiple of the idle one plus the slack
+CHAT_TTFB_FACTOR = 3
+CHAT_TTFB_SLACK = 0.25
+# Tokens that arrive closer together than this on average were buffered, not streamed
+CHAT_MIN_TOKEN_INTERVAL = 0.005
+
+ChatStream = namedtuple("ChatStream", ["ttfb", "total", "tokens", "done"])
+
+def iter_sse(response):
+    """Yield the data of each Server-Sent Event as soon as it arrives"""
+    buffer = b""
+    for chunk in response.iter_content(chunk_size=None):
+        buffer += chunk.replace(b"\r\n", b"\n")
+        while b"\n\n" in buffer:
+            event, buffer = buffer.split(b"\n\n", 1)
+            data = [line[5:].lstrip() for line in event.split(b"\n") if line.startswith(b"data:")]
+            if data:
+                yield b"\n".join(data).decode()
+
+def stream_chat(message, cancel_after=None):
+    """Stream one chat reply, hanging up after `cancel_after` tokens if given"""
+    start = time.perf_counter()
+    response = api.post(
+        f"{API_BASE}/chat/stream",
+        json={"messages": [{"role": "user", "content": message}]},
+        headers={"Accept": "text/event-stream"},
+        stream=True,
+        timeout=30
+    )
+    if response.status_code != 200:
+        response.close()
+        raise RuntimeError(f"chat stream returned {response.status_code}")
+    if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+        response.close()
+        raise RuntimeError(f"unexpected Content-Type {response.headers.get('Content-Type')}")
     
-    print(f"\nOverall: {passed}/{total} tests passed")
+    ttfb = None
+    tokens = 0
+    done = False
+    try:
+        for data in iter_sse(response):
+            if data == "[DONE]":
+                done = True
+                break
+            json.loads(data)["token"]
+            tokens += 1
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            if cancel_after and tokens >= cancel_after:
+                break
+    finally:
+        # Closing an unfinished stream drops the connection: that is the cancellation
+        response.close()
+    return ChatStream(ttfb, time.perf_counter() - start, tokens, done)
+
+def get_chat_stats():
+    return api.get(f"{API_BASE}/chat/stats", timeout=10).json()
+
+def test_chat_stream():
+    """Test POST /api/chat/stream: token streaming, cancellation and concurrent streams"""
+    print("\n🧪 Testing POST /api/chat/stream (SSE tokens, cancellation, concurrency)")
     
-    if passed == total:
-        print("🎉 All backend tests PASSED!")
+    try:
+        # An empty body is rejected before any model call, or shows the route isn't there
+        probe = api.post(f"{API_BASE}/chat/stream", json={}, timeout=10)
+        if route_missing(probe, "POST /api/chat/stream"):
+            return True
+        
+        single = stream_chat("Summarize my notes on photosynthesis")
+        if not single.done or single.tokens < 2:
+            print(f"   ❌ Stream ended after {single.tokens} tokens without [DONE]")
+            return False
+        spread = single.total - single.ttfb
+        print(f"   {single.tokens} tokens: first after {single.ttfb * 1000:.0f}ms, "
+              f"last {spread * 1000:.0f}ms later")
+        if spread < (single.tokens - 1) * CHAT_MIN_TOKEN_INTERVAL:
+            print("   ❌ Tokens arrived together; the reply is buffered, not streamed")
+            return False
+        
+        print("   ✅ Tokens stream as they are generated")
+        
+        before = get_chat_stats()
+        if GENERATOR_STUB_URL:
+            upstream_before = get_generator_stats()["cancelled"]
+        cancelled = stream_chat("Explain the Calvin cycle step by step", cancel_after=1)
+        deadline = time.perf_counter() + 3
+        while time.perf_counter() < deadline:
+            after = get_chat_stats()
+            if after["cancelled"] > before["cancelled"] and after["active"] <= before["active"]:
+                break
+            time.sleep(0.1)
+        else:
+            print(f"   ❌ Stream not cancelled after the client hung up: {after}")
+            return False
+        if cancelled.done:
+            print("   ❌ Cancelled stream still ran to [DONE]")
+            return False
+        if GENERATOR_STUB_URL:
+            while time.perf_counter() < deadline and get_generator_stats()["cancelled"] <= upstream_before:
+                time.sleep(0.1)
+            if get_generator_stats()["cancelled"] <= upstream_before:
+                print("   ❌ Cancellation never reached the model")
+                return False
+        
+        print("   ✅ Client disconnect cancels the stream" + (" and the model call" if GENERATOR_STUB_URL else ""))
+        
+        def try_stream(message):
+            # A refused or broken stream means this level didn't hold, not that the test crashed
+            try:
+                return stream_chat(message)
+            except Exception as e:
+                return e
+        
+        bound = single.ttfb * CHAT_TTFB_FACTOR + CHAT_TTFB_SLACK
+        capacity = 0
+        for level in CHAT_STREAM_LEVELS:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=level) as pool:
+                outcomes = list(pool.map(api.labelled(try_stream),
+                                         [f"Quiz me on topic {index}" for index in range(level)]))
+            wall = time.perf_counter() - start
+            streams = [outcome for outcome in outcomes if isinstance(outcome, ChatStream)]
+            errors = [outcome for outcome in outcomes if not isinstance(outcome, ChatStream)]
+            completed = sum(1 for stream in streams if stream.done)
+            p95 = percentile(sorted(stream.ttfb for stream in streams if stream.ttfb is not None), 95)
+            held = completed == level and p95 <= bound
+            print(f"   {'✅' if held else '⚠️ '} {level} concurrent streams: {completed} completed, "
+                  f"TTFB p95 {p95 * 1000:.0f}ms (bound {bound * 1000:.0f}ms), wall {wall:.2f}s")
+            if errors:
+                print(f"      {len(errors)} streams failed, e.g. {errors[0]}")
+            if not held:
+                break
+            capacity = level
+        
+        print(f"   Chat streams at once: {capacity} (peak {get_chat_stats()['max_active']} active)")
+        if capacity < CHAT_MIN_STREAMS:
+            print(f"   ❌ Fewer than {CHAT_MIN_STREAMS} concurrent streams; chats are tying up workers")
+            return False
+        
+        print(f"   ✅ {capacity} chats multiplexed on the event loop")
         return True
-    else:
-        print("⚠️  Some backend tests FAILED!")
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
         return False
 
-if __name__ == "__main__":
-    success = run_all_tests()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+# ============ FIXTURE STORE ============
+
+# Namespace for this run's fixtures. Every seeded document carries it as
+# test_run, so concurrent runs (or shards of one run) only ever clean up their own.
+RUN_ID = os.environ.get("TEST_RUN_ID") or uuid.uuid4().hex[:12]
+
+class FixtureStore:
+    """Seeds and removes test users and sessions over one pooled MongoDB connection.
+
+    MONGO_URL "mongomock://" swaps in an in-memory stand-in (requires the
+    mongomock package) so fixtures can be exercised without a mongod.
+    """
+
+    def __init__(self, mongo_url, db_name):
+        self.in_memory = mongo_url.startswith("mongomock://")
+        if self.in_memory:
+            import mongomock
+            self.client = mongomock.MongoClient()
+        else:
+            from pymongo import MongoClient
+            self.client = MongoClient(mongo_url, maxPoolSize=20, serverSelectionTimeoutMS=5000)
+        self.db = self.client[db_name]
+        if self.in_memory:
+            # A real database gets these from backend startup
+            self.ensure_indexes()
+        # The harness owns the run tag, so it creates the tag's index itself
+        for collection in ("users", "user_sessions"):
+            self.db[collection].create_index([("test_run", 1)], sparse=True)
+
+    def seed(self, users=(), sessions=()):
+        """Insert users and sessions with one bulk write per collection"""
+        if users:
+            self.db.users.insert_many(list(users), ordered=False)
+        if sessions:
+            self.db.user_sessions.insert_many(list(sessions), ordered=False)
+            if api.recorder:
+                api.recorder.record_sessions(sessions)
+
+    def cleanup(self):
+        """Delete this run's test users and sessions, returning (users, sessions) removed"""
+        # Sessions the backend minted (stub exchanges) carry no tag; claim them by token
+        tokens = api.take_issued_sessions()
+        user_ids = []
+        if tokens:
+            minted = self.db.user_sessions.find({"session_token": {"$in": tokens}}, {"_id": 0, "user_id": 1})
+            user_ids = list({session["user_id"] for session in minted})
+        
+        users = self.db.users.delete_many({"$or": [{"test_run": RUN_ID}, {"user_id": {"$in": user_ids}}]})
+        sessions = self.db.user_sessions.delete_many({"$or": [
+            {"test_run": RUN_ID},
+            {"session_token": {"$in": tokens}},
+            {"user_id": {"$in": user_ids}},
+        ]})
+        return users.deleted_count, sessions.deleted_count
+
+    def remove(self, user_ids):
+        """Delete the given test users and all their sessions"""
+        self.db.users.delete_many({"user_id": {"$in": list(user_ids)}})
+        self.db.user_sessions.delete_many({"user_id": {"$in": list(user_ids)}})
+
+    def ensure_indexes(self):
+        """Create every index in required_indexes() (idempotent)"""
+        for collection, keys, options in required_indexes():
+            self.db[collection].create_index(keys, **options)
+
+    def missing_indexes(self):
+        """Return the required_indexes() entries the database does not have"""
+        missing = []
+        for collection, keys, options in required_indexes():
+            existing = self.db[collection].index_information().values()
+            if not any(index_matches(index, keys, options) for index in existing):
+                missing.append((collection, keys, options))
+        return missing
+
+    def plan_stages(self, collection, query, sort=None):
+        """Return every stage in the winning plan for find(query)"""
+        cursor = self.db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort).limit(STATUS_MAX_PAGE_SIZE)
+        return list(iter_plan_stages(cursor.explain()["queryPlanner"]["winningPlan"]))
+
+# (collection, keys, options) for every index the backend's queries rely on
+REQUIRED_INDEXES = [
+    ("users", [("user_id", 1)], {"unique": True}),
+    ("users", [("email", 1)], {"unique": True}),
+    ("user_sessions", [("session_token", 1)], {"unique": True}),
+    ("user_sessions", [("user_id", 1)], {}),
+    # TTL: the server purges sessions as soon as expires_at passes
+    ("user_sessions", [("expires_at", 1)], {"expireAfterSeconds": 0}),
+    ("status_checks", [("id", 1)], {"unique": True}),
+    ("status_checks", [("timestamp", -1), ("id", -1)], {}),
+]
+
+# Only required when the backend issues signed session tokens (SESSION_SIGNING_KEY)
+SIGNED_TOKEN_INDEXES = [
+    ("revoked_sessions", [("jti", 1)], {"unique": True}),
+    ("revoked_sessions", [("expires_at", 1)], {"expireAfterSeconds": 0}),
+]
+
+# (description, collection, query, sort) for the queries on the request path
+HOT_QUERIES = [
+    ("users by user_id", "users", {"user_id": "test-user-plan"}, None),
+    ("users by email", "users", {"email": "test.user.plan@example.com"}, None),
+    ("sessions by session_token", "user_sessions", {"session_token": "test_session_plan"}, None),
+    ("sessions by user_id", "user_sessions", {"user_id": "test-user-plan"}, None),
+    ("cleanup users", "users", {"test_run": "plan"}, None),
+    ("cleanup sessions", "user_sessions", {"test_run": "plan"}, None),
+    ("status check by id", "status_checks", {"id": "plan"}, None),
+    ("status checks newest page", "status_checks", {}, [("timestamp", -1), ("id", -1)]),
+]
+
+SIGNED_TOKEN_HOT_QUERIES = [
+    ("revocations by jti", "revoked_sessions", {"jti": "plan"}, None),
+]
+
+def required_indexes():
+    """REQUIRED_INDEXES, plus SIGNED_TOKEN_INDEXES when signed session tokens are enabled"""
+    return REQUIRED_INDEXES + (SIGNED_TOKEN_INDEXES if get_session_signing_key() else [])
+
+def hot_queries():
+    """HOT_QUERIES, plus SIGNED_TOKEN_HOT_QUERIES when signed session tokens are enabled"""
+    return HOT_QUERIES + (SIGNED_TOKEN_HOT_QUERIES if get_session_signing_key() else [])
+
+def index_matches(index, keys, options):
+    """Whether an index_information() entry has the given keys and options"""
+    if [(field, int(direction)) for field, direction in index["key"]] != keys:
+        return False
+    return all(index.get(option) == value for option, value in options.items())
+
+def iter_plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from iter_plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from iter_plan_stages(item)
+
+_fixture_store = None
+_fixture_store_lock = threading.Lock()
+
+def get_fixture_store():
+    """Return the shared FixtureStore, connecting on first use"""
+    global _fixture_store
+    with _fixture_store_lock:
+        if _fixture_store is None:
+            mongo_url, db_name = get_mongo_settings()
+            _fixture_store = FixtureStore(mongo_url, db_name)
+        return _fixture_store
+
+def make_test_user(user_id, email, name="Test User OAuth"):
+    return {
+        "user_id": user_id,
+        "email": email,
+        "name": name,
+        "picture": "https://via.placeholder.com/150",
+        "created_at": datetime.now(timezone.utc),
+        "test_run": RUN_ID,
+    }
+
+def make_test_session(user_id, session_token, expires_in=timedelta(days=7)):
+    now = datetime.now(timezone.utc)
+    return {
+        "user_id": user_id,
+        "session_token": session_token,
+        "expires_at": now + expires_in,
+        "created_at": now,
+        "test_run": RUN_ID,
+    }
+
+def fixture_suffix():
+    # Millisecond timestamp plus a random tail so concurrent tests never collide
+    return f"{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+
+def create_test_user_and_session(expires_in=timedelta(days=7)):
+    """Create test user and session in MongoDB"""
+    print("   📝 Creating test user and session in MongoDB...")
+    
+    suffix = fixture_suffix()
+    user_id = f"test-user-{suffix}"
+    session_token = f"test_session_{suffix}"
+    email = f"test.user.{suffix}@example.com"
+    
+    try:
+        get_fixture_store().seed(
+            users=[make_test_user(user_id, email)],
+            sessions=[make_test_session(user_id, session_token, expires_in)],
+        )
+        print(f"   ✅ Created test user: {user_id}")
+        print(f"   ✅ Created session token: {session_token}")
+        return user_id, session_token, email
+            
+    except Exception as e:
+        print(f"   ❌ Error creating test data: {e}")
+        return None, None, None
+
+def cleanup_test_data():
+    """Clean up test data from MongoDB"""
+    print("   🧹 Cleaning up test data...")
+    
+    try:
+        users, sessions = get_fixture_store().cleanup()
+        print(f"   ✅ Test data cleaned up ({users} users, {sessions} sessions)")
+            
+    except Exception as e:
+        print(f"   ⚠️  Cleanup error: {e}")
+
+def test_index_plans():
+    """Test that required indexes exist and hot queries never COLLSCAN"""
+    print("\n🧪 Testing MongoDB indexes and query plans")
+    
+    try:
+        store = get_fixture_store()
+        
+        missing = store.missing_indexes()
+        if missing:
+            for collection, keys, options in missing:
+                print(f"   ❌ Missing index on {collection}: {keys} {options}")
+            return False
+        
+        print(f"   ✅ All {len(required_indexes())} required indexes present")
+        
+        if store.in_memory:
+            print("   ⚠️  In-memory stand-in has no query planner, skipping explain()")
+            return True
+        
+        passed = True
+        for description, collection, query, sort in hot_queries():
+            stages = store.plan_stages(collection, query, sort)
+            if "COLLSCAN" in stages:
+                print(f"   ❌ {description}: COLLSCAN ({' > '.join(stages)})")
+                passed = False
+            else:
+                print(f"   ✅ {description}: {' > '.join(stages)}")
+        
+        return passed
+            
+    except Exception as e:
+        print(f"   ❌ Error checking indexes: {e}")
+        return False
+
+# ============ OAUTH TESTING FUNCTIONS ============
+
+def test_oauth_session_exchange():
+    """Test POST /api/auth/session endpoint"""
+    print("\n🧪 Testing POST /api/auth/session (Session Exchange)")
+    
+    # This endpoint requires a valid session_id from Emergent Auth
+    # Since we can't get a real session_id in testing, we test the endpoint structure
+    # and error handling
+    
+    test_data = {"session_id": "invalid_test_session_id"}
+    
+    try:
+        response = api.post(
+            f"{API_BASE}/auth/session",
+            json=test_data,
+            headers={"Content-Type": "application/json"},
+            timeout=10
+        )
+        
+        print(f"   Status Code: {response.status_code}")
+        print(f"   Response: {response.text}")
+        
+        # We expect this to fail since we're using an invalid session_id
+        # The endpoint should handle the error gracefully
+        if response.status_code in [401, 500, 520]:  # Accept various error codes
+            try:
+                error_data = response.json()
+                if "detail" in error_data:
+                    print("   ✅ Session exchange endpoint structure correct")
+                    print("   ✅ Properly handles invalid session_id (expected behavior)")
+                    return True
+                else:
+                    print("   ❌ Error response missing 'detail' field")
+                    return False
+            except:
+                print("   ❌ Error response not valid JSON")
+                return False
+        elif response.status_code == 504:
+            print("   ✅ Auth service timeout handled correctly")
+            return True
+        else:
+            print(f"   ❌ Unexpected status code: {response.status_code}")
+            return False
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        return False
+
+# Set with --auth-stub when the backend's auth upstream is auth_stub_server.py
+AUTH_STUB_URL = None
+
+def test_oauth_stub_session_exchange():
+    """Test the full POST /api/auth/session path against the local auth stub"""
+    print("\n🧪 Testing POST /api/auth/session against the auth stub")
+    
+    if not AUTH_STUB_URL:
+        print("   ⚠️  Skipped: run with --auth-stub to exercise a successful exchange")
+        return True
+    
+    session_id = f"stub-{uuid.uuid4().hex}"
+    
+    try:
+        response = api.post(
+            f"{API_BASE}/auth/session",
+            json={"session_id": session_id},
+            timeout=30
+        )
+        print(f"   Status Code: {response.status_code}")
+        
+        if response.status_code != 200:
+            print(f"   ❌ Session exchange failed: {response.text}")
+            cleanup_test_data()
+            return False
+        
+        session_token = response.cookies.get("session_token")
+        if not session_token:
+            print("   ❌ No session_token cookie set")
+            cleanup_test_data()
+            return False
+        
+        print("   ✅ Session exchanged and cookie set")
+        
+        session = get_fixture_store().db.user_sessions.find_one(
+            {"session_token": session_token}, {"_id": 0}
+        )
+        if not session:
+            print("   ❌ Session not stored in user_sessions")
+            cleanup_test_data()
+            return False
+        
+        expires_at = session["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        lifetime = expires_at - datetime.now(timezone.utc)
+        if abs(lifetime - timedelta(days=7)) > timedelta(hours=1):
+            print(f"   ❌ Expected a 7-day session, got {lifetime}")
+            cleanup_test_data()
+            return False
+        
+        print("   ✅ Session stored with 7-day expiry")
+        
+        me_response = api.get(
+            f"{API_BASE}/auth/me",
+            cookies={"session_token": session_token},
+            timeout=10
+        )
+        cleanup_test_data()
+        
+        if me_response.status_code != 200:
+            print(f"   ❌ /auth/me with exchanged session failed: {me_response.status_code}")
+            return False
+        
+        if me_response.json().get("user_id") != session["user_id"]:
+            print(f"   ❌ /auth/me returned the wrong user: {me_response.text}")
+            return False
+        
+        print("   ✅ Exchanged session authenticates /auth/me")
+        return True
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        cleanup_test_data()
+        return False
+
+# Upper bound on how long the backend may wait on a hung auth upstream before its 504
+UPSTREAM_DEADLINE_BOUND = 15
+
+def get_auth_stub_stats():
+    """Read the auth stub's traffic counters"""
+    return api.get(f"{AUTH_STUB_URL}/stats", timeout=10).json()
+
+def test_oauth_upstream_client():
+    """Test upstream connection reuse, request coalescing and deadlines"""
+    print("\n🧪 Testing session exchange upstream client (pooling, coalescing, deadlines)")
+    
+    if not AUTH_STUB_URL:
+        print("   ⚠️  Skipped: run with --auth-stub to inspect upstream traffic")
+        return True
+    
+    def exchange(session_id):
+        return api.post(
+            f"{API_BASE}/auth/session",
+            json={"session_id": session_id},
+            timeout=30
+        )
+    
+    try:
+        # AuthCallback.tsx can fire the same session_id more than once
+        session_id = f"stub-coalesce-{uuid.uuid4().hex}"
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(api.labelled(exchange), [session_id] * 8))
+        
+        statuses = [response.status_code for response in responses]
+        tokens = {response.cookies.get("session_token") for response in responses}
+        upstream_calls = get_auth_stub_stats()["by_session_id"].get(session_id, 0)
+        print(f"   Concurrent exchanges: {statuses}, upstream calls: {upstream_calls}")
+        
+        if any(status != 200 for status in statuses):
+            print("   ❌ Concurrent exchanges of one session_id failed")
+            cleanup_test_data()
+            return False
+        
+        if len(tokens) != 1:
+            print(f"   ❌ Coalesced exchanges disagreed: {len(tokens)} distinct sessions")
+            cleanup_test_data()
+            return False
+        
+        if upstream_calls != 1:
+            print(f"   ❌ Expected 1 upstream call for 8 concurrent exchanges, got {upstream_calls}")
+            cleanup_test_data()
+            return False
+        
+        print("   ✅ Concurrent exchanges of one session_id coalesced into one upstream call")
+        
+        exchanges = 5
+        before = get_auth_stub_stats()["connections"]
+        for _ in range(exchanges):
+            if exchange(f"stub-{uuid.uuid4().hex}").status_code != 200:
+                print("   ❌ Sequential exchange failed")
+                cleanup_test_data()
+                return False
+        new_connections = get_auth_stub_stats()["connections"] - before
+        cleanup_test_data()
+        
+        if new_connections >= exchanges:
+            print(f"   ❌ {exchanges} exchanges opened {new_connections} upstream connections")
+            return False
+        
+        print(f"   ✅ {exchanges} exchanges reused keep-alive connections ({new_connections} new)")
+        
+        start = time.perf_counter()
+        timeout_response = exchange(f"timeout-{uuid.uuid4().hex}")
+        elapsed = time.perf_counter() - start
+        print(f"   Hung upstream: {timeout_response.status_code} after {elapsed:.2f}s")
+        
+        if timeout_response.status_code != 504:
+            print(f"   ❌ Expected 504 for a hung upstream, got {timeout_response.status_code}")
+            return False
+        
+        if elapsed > UPSTREAM_DEADLINE_BOUND:
+            print(f"   ❌ Deadline too loose: {elapsed:.2f}s > {UPSTREAM_DEADLINE_BOUND}s")
+            return False
+        
+        print("   ✅ Hung upstream mapped to 504 within the deadline")
+        return True
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        cleanup_test_data()
+        return False
+
+def test_oauth_auth_me():
+    """Test GET /api/auth/me endpoint"""
+    print("\n🧪 Testing GET /api/auth/me (Auth Verification)")
+    
+    # Create test user and session
+    user_id, session_token, email = create_test_user_and_session()
+    
+    if not session_token:
+        print("   ❌ Failed to create test data")
+        return False
+    
+    try:
+        # Test 1: Authorization header method
+        print("   🔍 Testing Authorization header method...")
+        response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": f"Bearer {session_token}"},
+            timeout=10
+        )
+        
+        print(f"   Status Code: {response.status_code}")
+        print(f"   Response: {response.text}")
+        
+        if response.status_code == 200:
+            data = response.json()
+            
+            # Validate response structure
+            required_fields = ["user_id", "email", "name", "created_at"]
+            missing_fields = [field for field in required_fields if field not in data]
+            
+            if missing_fields:
+                print(f"   ❌ Missing fields in response: {missing_fields}")
+                cleanup_test_data()
+                return False
+            
+            # Validate field values
+            if data["user_id"] != user_id:
+                print(f"   ❌ User ID mismatch: expected {user_id}, got {data['user_id']}")
+                cleanup_test_data()
+                return False
+            
+            if data["email"] != email:
+                print(f"   ❌ Email mismatch: expected {email}, got {data['email']}")
+                cleanup_test_data()
+                return False
+            
+            print("   ✅ Authorization header authentication working")
+            
+            # Test 2: Cookie method
+            print("   🔍 Testing cookie method...")
+            cookie_response = api.get(
+                f"{API_BASE}/auth/me",
+                cookies={"session_token": session_token},
+                timeout=10
+            )
+            
+            if cookie_response.status_code == 200:
+                cookie_data = cookie_response.json()
+                if cookie_data["user_id"] == user_id:
+                    print("   ✅ Cookie authentication working")
+                    cleanup_test_data()
+                    return True
+                else:
+                    print("   ❌ Cookie auth returned wrong user")
+                    cleanup_test_data()
+                    return False
+            else:
+                print(f"   ❌ Cookie auth failed: {cookie_response.status_code}")
+                cleanup_test_data()
+                return False
+                
+        else:
+            print(f"   ❌ Auth verification failed: {response.status_code}")
+            cleanup_test_data()
+            return False
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        cleanup_test_data()
+        return False
+
+def test_oauth_logout():
+    """Test POST /api/auth/logout endpoint"""
+    print("\n🧪 Testing POST /api/auth/logout (Logout)")
+    
+    # Create test user and session
+    user_id, session_token, email = create_test_user_and_session()
+    
+    if not session_token:
+        print("   ❌ Failed to create test data")
+        return False
+    
+    try:
+        # First verify the session exists
+        auth_response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": f"Bearer {session_token}"},
+            timeout=10
+        )
+        
+        if auth_response.status_code != 200:
+            print("   ❌ Test session not working before logout test")
+            cleanup_test_data()
+            return False
+        
+        print("   ✅ Test session verified before logout")
+        
+        # Test logout
+        logout_response = api.post(
+            f"{API_BASE}/auth/logout",
+            headers={"Authorization": f"Bearer {session_token}"},
+            timeout=10
+        )
+        
+        print(f"   Logout Status Code: {logout_response.status_code}")
+        print(f"   Logout Response: {logout_response.text}")
+        
+        if logout_response.status_code == 200:
+            logout_data = logout_response.json()
+            
+            if "message" in logout_data and "Logged out" in logout_data["message"]:
+                print("   ✅ Logout endpoint returns correct message")
+                
+                # Verify session is deleted - should get 401 now
+                verify_response = api.get(
+                    f"{API_BASE}/auth/me",
+                    headers={"Authorization": f"Bearer {session_token}"},
+                    timeout=10
+                )
+                
+                if verify_response.status_code == 401:
+                    print("   ✅ Session properly deleted from database")
+                    cleanup_test_data()
+                    return True
+                else:
+                    print(f"   ❌ Session still valid after logout: {verify_response.status_code}")
+                    cleanup_test_data()
+                    return False
+            else:
+                print(f"   ❌ Unexpected logout response: {logout_data}")
+                cleanup_test_data()
+                return False
+        else:
+            print(f"   ❌ Logout failed: {logout_response.status_code}")
+            cleanup_test_data()
+            return False
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        cleanup_test_data()
+        return False
+
+def test_oauth_error_scenarios():
+    """Test OAuth error handling scenarios"""
+    print("\n🧪 Testing OAuth Error Scenarios")
+    
+    try:
+        # Test 1: No authentication
+        print("   🔍 Testing no authentication...")
+        no_auth_response = api.get(f"{API_BASE}/auth/me", timeout=10)
+        
+        if no_auth_response.status_code == 401:
+            print("   ✅ Correctly returns 401 for no authentication")
+        else:
+            print(f"   ❌ Expected 401, got {no_auth_response.status_code}")
+            return False
+        
+        # Test 2: Invalid session token
+        print("   🔍 Testing invalid session token...")
+        invalid_response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": "Bearer invalid_token_12345"},
+            timeout=10
+        )
+        
+        if invalid_response.status_code == 401:
+            print("   ✅ Correctly returns 401 for invalid token")
+        else:
+            print(f"   ❌ Expected 401 for invalid token, got {invalid_response.status_code}")
+            return False
+        
+        # Test 3: Expired session (create and immediately expire)
+        print("   🔍 Testing expired session...")
+        
+        expired_user_id, expired_session_token, _ = create_test_user_and_session(
+            expires_in=timedelta(seconds=-1)  # Expired 1 second ago
+        )
+        
+        if not expired_session_token:
+            print("   ❌ Failed to create expired session")
+            return False
+        
+        expired_response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": f"Bearer {expired_session_token}"},
+            timeout=10
+        )
+        
+        if expired_response.status_code == 401:
+            print("   ✅ Correctly handles expired session")
+            cleanup_test_data()
+            return True
+        else:
+            print(f"   ❌ Expected 401 for expired session, got {expired_response.status_code}")
+            cleanup_test_data()
+            return False
+            
+    except Exception as e:
+        print(f"   ❌ Error testing error scenarios: {e}")
+        cleanup_test_data()
+        return False
+
+def get_auth_cache_stats():
+    """Read the session cache hit/miss counters, or None if unavailable"""
+    response = api.get(f"{API_BASE}/auth/cache-stats", timeout=10)
+    if response.status_code != 200:
+        print(f"   ❌ Cache stats failed: {response.status_code}")
+        return None
+    return response.json()
+
+def test_auth_session_cache():
+    """Test the session cache in front of GET /api/auth/me"""
+    print("\n🧪 Testing session cache (hits, logout and expiry invalidation)")
+    
+    user_id, session_token, email = create_test_user_and_session()
+    
+    if not session_token:
+        print("   ❌ Failed to create test data")
+        return False
+    
+    try:
+        probe = api.get(f"{API_BASE}/auth/cache-stats", timeout=10)
+        if route_missing(probe, "GET /api/auth/cache-stats"):
+            cleanup_test_data()
+            return True
+        
+        before = get_auth_cache_stats()
+        if before is None:
+            cleanup_test_data()
+            return False
+        
+        for _ in range(3):
+            response = api.get(
+                f"{API_BASE}/auth/me",
+                headers={"Authorization": f"Bearer {session_token}"},
+                timeout=10
+            )
+            if response.status_code != 200 or response.json().get("user_id") != user_id:
+                print(f"   ❌ Auth check failed: {response.status_code}")
+                cleanup_test_data()
+                return False
+        
+        after = get_auth_cache_stats()
+        if after is None:
+            cleanup_test_data()
+            return False
+        
+        hits = after["hits"] - before["hits"]
+        misses = after["misses"] - before["misses"]
+        print(f"   Cache hits: +{hits}, misses: +{misses}")
+        
+        # Other tests may share the counters, so only lower bounds are meaningful
+        if misses < 1 or hits < 2:
+            print("   ❌ Repeated auth checks were not served from the cache")
+            cleanup_test_data()
+            return False
+        
+        print("   ✅ Repeated auth checks served from cache")
+        
+        logout_response = api.post(
+            f"{API_BASE}/auth/logout",
+            headers={"Authorization": f"Bearer {session_token}"},
+            timeout=10
+        )
+        verify_response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": f"Bearer {session_token}"},
+            timeout=10
+        )
+        if logout_response.status_code != 200 or verify_response.status_code != 401:
+            print(f"   ❌ Cached session survived logout: {verify_response.status_code}")
+            cleanup_test_data()
+            return False
+        
+        print("   ✅ Logout invalidates the cached session immediately")
+        
+        # Seeded just before use, so the 2 seconds aren't spent on the checks above
+        _, expiring_token, _ = create_test_user_and_session(expires_in=timedelta(seconds=2))
+        if not expiring_token:
+            print("   ❌ Failed to create expiring session")
+            cleanup_test_data()
+            return False
+        
+        warm_response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": f"Bearer {expiring_token}"},
+            timeout=10
+        )
+        if warm_response.status_code != 200:
+            print(f"   ❌ Expiring session rejected early: {warm_response.status_code}")
+            cleanup_test_data()
+            return False
+        
+        time.sleep(2.5)
+        expired_response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": f"Bearer {expiring_token}"},
+            timeout=10
+        )
+        cleanup_test_data()
+        
+        if expired_response.status_code != 401:
+            print(f"   ❌ Cached session served after expiry: {expired_response.status_code}")
+            return False
+        
+        print("   ✅ Cached session rejected as soon as it expires")
+        return True
+            
+    except Exception as e:
+        print(f"   ❌ Error testing session cache: {e}")
+        cleanup_test_data()
+        return False
+
+# Signed session tokens: "v1.<payload>.<signature>", both base64url without
+# padding. The payload is JSON {"sub": user_id, "exp": epoch seconds, "jti": id}
+# and the signature is HMAC-SHA256 over "v1.<payload>" with SESSION_SIGNING_KEY.
+SIGNED_TOKEN_VERSION = "v1"
+# Logged-out signed tokens by jti, kept until the token would have expired anyway
+REVOKED_SESSIONS_COLLECTION = "revoked_sessions"
+
+def b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def sign_session_token(user_id, expires_in=timedelta(days=7), key=None, jti=None):
+    """Mint a signed session token the way the backend does"""
+    payload = json.dumps({
+        "sub": user_id,
+        "exp": int((datetime.now(timezone.utc) + expires_in).timestamp()),
+        "jti": jti or uuid.uuid4().hex,
+    }, separators=(",", ":")).encode()
+    signed = f"{SIGNED_TOKEN_VERSION}.{b64url(payload)}"
+    signature = hmac.new((key or get_session_signing_key()).encode(), signed.encode(), hashlib.sha256)
+    return f"{signed}.{b64url(signature.digest())}"
+
+def test_signed_session_tokens():
+    """Test HMAC-signed session tokens: no session lookup, and the same 401s as opaque tokens"""
+    print("\n🧪 Testing signed session tokens")
+    
+    if not get_session_signing_key():
+        print("   ⚠️  Skipped: no SESSION_SIGNING_KEY in the environment or backend/.env")
+        return True
+    
+    suffix = fixture_suffix()
+    user_id = f"test-user-signed-{suffix}"
+    jti = uuid.uuid4().hex
+    
+    def auth_me(token):
+        return api.get(f"{API_BASE}/auth/me", headers={"Authorization": f"Bearer {token}"}, timeout=10)
+    
+    try:
+        # Only the user exists in MongoDB; there is no user_sessions document to look up
+        store = get_fixture_store()
+        store.seed(users=[make_test_user(user_id, f"test.user.signed.{suffix}@example.com")])
+        token = sign_session_token(user_id, jti=jti)
+        
+        response = auth_me(token)
+        if response.status_code != 200 or response.json().get("user_id") != user_id:
+            print(f"   ❌ Signed token rejected: {response.status_code} {response.text}")
+            cleanup_test_data()
+            return False
+        
+        round_trips = db_round_trips(response)
+        if round_trips is None:
+            print(f"   ❌ Signed token response has no {DB_ROUND_TRIPS_HEADER} header")
+            cleanup_test_data()
+            return False
+        if round_trips > 1:
+            print(f"   ❌ Signed token took {round_trips} DB round trips; validation must not read MongoDB")
+            cleanup_test_data()
+            return False
+        
+        print(f"   ✅ Signed token accepted without a session document ({round_trips} DB round trips)")
+        
+        header, payload, signature = token.split(".")
+        tampered = f"{header}.{payload}.{'B' if signature[0] == 'A' else 'A'}{signature[1:]}"
+        forged_claims = b64url(json.dumps({"sub": f"{user_id}-other", "exp": 4102444800, "jti": jti}).encode())
+        rejected = {
+            "tampered signature": tampered,
+            "forged payload": f"{header}.{forged_claims}.{signature}",
+            "wrong key": sign_session_token(user_id, key=uuid.uuid4().hex),
+            "expired": sign_session_token(user_id, expires_in=timedelta(seconds=-1)),
+            "unknown version": f"v0.{payload}.{signature}",
+        }
+        for name, bad_token in rejected.items():
+            status = auth_me(bad_token).status_code
+            if status != 401:
+                print(f"   ❌ Expected 401 for a {name} token, got {status}")
+                cleanup_test_data()
+                return False
+        
+        print(f"   ✅ {', '.join(rejected)} tokens all return 401")
+        
+        logout_response = api.post(
+            f"{API_BASE}/auth/logout",
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=10
+        )
+        revoked_response = auth_me(token)
+        revocation = store.db[REVOKED_SESSIONS_COLLECTION].find_one({"jti": jti}, {"_id": 0})
+        store.db[REVOKED_SESSIONS_COLLECTION].delete_one({"jti": jti})
+        cleanup_test_data()
+        
+        if logout_response.status_code != 200 or revoked_response.status_code != 401:
+            print(f"   ❌ Signed token still valid after logout: {revoked_response.status_code}")
+            return False
+        
+        print("   ✅ Logout revokes the signed token immediately")
+        
+        if not revocation:
+            print(f"   ❌ Revocation not persisted to {REVOKED_SESSIONS_COLLECTION}; other replicas would accept it")
+            return False
+        
+        print(f"   ✅ Revocation shared through {REVOKED_SESSIONS_COLLECTION}")
+        return True
+            
+    except Exception as e:
+        print(f"   ❌ Error testing signed tokens: {e}")
+        cleanup_test_data()
+        return False
+
+# Set by the backend's MongoDB command listener on every /api response
+DB_ROUND_TRIPS_HEADER = "X-DB-Round-Trips"
+
+def db_round_trips(response):
+    """Number of MongoDB commands the backend issued for a response, or None"""
+    value = response.headers.get(DB_ROUND_TRIPS_HEADER)
+    return int(value) if value is not None else None
+
+def test_auth_single_round_trip():
+    """Test that an authenticated request costs exactly one MongoDB round trip"""
+    print("\n🧪 Testing auth resolution round trips (session + user in one aggregation)")
+    
+    user_id, session_token, email = create_test_user_and_session()
+    
+    if not session_token:
+        print("   ❌ Failed to create test data")
+        return False
+    
+    try:
+        # A freshly seeded token cannot be cached yet, so this must reach Mongo
+        response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": f"Bearer {session_token}"},
+            timeout=10
+        )
+        round_trips = db_round_trips(response)
+        print(f"   Status Code: {response.status_code}, round trips: {round_trips}")
+        
+        if response.status_code != 200 or response.json().get("user_id") != user_id:
+            print(f"   ❌ Auth verification failed: {response.status_code}")
+            cleanup_test_data()
+            return False
+        
+        if round_trips is None:
+            print(f"   ⚠️  No {DB_ROUND_TRIPS_HEADER} header on this backend, skipping")
+            cleanup_test_data()
+            return True
+        
+        if round_trips != 1:
+            print(f"   ❌ Expected exactly 1 DB round trip, got {round_trips}")
+            cleanup_test_data()
+            return False
+        
+        print("   ✅ Session and user resolved in a single round trip")
+        
+        # Repeat calls may be answered from the session cache
+        cookie_response = api.get(
+            f"{API_BASE}/auth/me",
+            cookies={"session_token": session_token},
+            timeout=10
+        )
+        invalid_response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": "Bearer invalid_token_12345"},
+            timeout=10
+        )
+        cleanup_test_data()
+        
+        for label, checked in [("cookie", cookie_response), ("invalid token", invalid_response)]:
+            round_trips = db_round_trips(checked)
+            if round_trips is None or round_trips > 1:
+                print(f"   ❌ {label} request used {round_trips} round trips")
+                return False
+            print(f"   ✅ {label} request used {round_trips} round trip(s)")
+        
+        return True
+            
+    except Exception as e:
+        print(f"   ❌ Error testing round trips: {e}")
+        cleanup_test_data()
+        return False
+
+def test_auth_me_conditional_get():
+    """Test ETag / If-None-Match on GET /api/auth/me"""
+    print("\n🧪 Testing conditional GET /api/auth/me (ETag / 304)")
+    
+    user_id, session_token, email = create_test_user_and_session()
+    other_user_id, other_token, _ = create_test_user_and_session()
+    
+    if not session_token or not other_token:
+        print("   ❌ Failed to create test data")
+        return False
+    
+    headers = {"Authorization": f"Bearer {session_token}"}
+    
+    try:
+        full = api.get(f"{API_BASE}/auth/me", headers=headers, timeout=10)
+        if full.status_code != 200:
+            print(f"   ❌ /auth/me failed: {full.status_code}")
+            cleanup_test_data()
+            return False
+        if etags_missing(full, "GET /api/auth/me"):
+            cleanup_test_data()
+            return True
+        etag = strong_etag(full)
+        if not etag:
+            cleanup_test_data()
+            return False
+        
+        for name, kwargs in [("header", {"headers": headers}),
+                             ("cookie", {"cookies": {"session_token": session_token}})]:
+            if not check_not_modified(full, revalidate(f"{API_BASE}/auth/me", etag, **kwargs)):
+                print(f"   ❌ Revalidation with {name} auth failed")
+                cleanup_test_data()
+                return False
+        
+        other = revalidate(f"{API_BASE}/auth/me", etag, headers={"Authorization": f"Bearer {other_token}"})
+        if other.status_code != 200 or other.json().get("user_id") != other_user_id:
+            print(f"   ❌ Another user's ETag matched: {other.status_code}")
+            cleanup_test_data()
+            return False
+        
+        print("   ✅ ETags are per user")
+        
+        api.post(f"{API_BASE}/auth/logout", headers=headers, timeout=10)
+        after_logout = revalidate(f"{API_BASE}/auth/me", etag, headers=headers)
+        cleanup_test_data()
+        
+        if after_logout.status_code != 401:
+            print(f"   ❌ Expected 401 after logout even with a matching ETag, got {after_logout.status_code}")
+            return False
+        
+        print("   ✅ A matching ETag never skips authentication")
+        return True
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        cleanup_test_data()
+        return False
+
+# Clients saturating the auth routes during the overload test, and for how long
+OVERLOAD_CLIENTS = 64
+OVERLOAD_DURATION = 3.0
+# GET /api/ p95 under auth overload may reach this multiple of its idle p95 plus the slack
+OVERLOAD_LATENCY_FACTOR = 5
+OVERLOAD_LATENCY_SLACK_MS = 50.0
+# Longest Retry-After the test will honour before checking the routes recover
+OVERLOAD_MAX_RETRY_AFTER = 10.0
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP-date), None if invalid"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def root_latencies_ms(deadline=None, count=20):
+    """Sequential GET /api/ latencies until `deadline`, or `count` of them without one"""
+    ms = []
+    while (time.perf_counter() < deadline) if deadline else len(ms) < count:
+        response = api.get(f"{API_BASE}/", timeout=10)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET /api/ returned {response.status_code}")
+        ms.append(response.timing.total * 1000)
+    return sorted(ms)
+
+def test_auth_overload():
+    """Test admission control on the auth routes keeps GET /api/ responsive"""
+    print("\n🧪 Testing auth admission control (429 + Retry-After under overload)")
+    
+    user_id, session_token, email = create_test_user_and_session()
+    if not session_token:
+        print("   ❌ Failed to create test data")
+        return False
+    
+    def saturate(index, deadline):
+        outcomes = []
+        while time.perf_counter() < deadline:
+            # Without the stub, session exchanges would flood the real Emergent Auth
+            if index % 2 or not AUTH_STUB_URL:
+                response = api.get(
+                    f"{API_BASE}/auth/me",
+                    headers={"Authorization": f"Bearer {session_token}"},
+                    timeout=30
+                )
+            else:
+                session_id = f"stub-overload-{uuid.uuid4().hex}"
+                response = api.post(f"{API_BASE}/auth/session", json={"session_id": session_id}, timeout=30)
+            outcomes.append((response.status_code, response.headers.get("Retry-After")))
+        return outcomes
+    
+    try:
+        if not AUTH_STUB_URL:
+            print("   ⚠️  No --auth-stub, saturating /auth/me only")
+        
+        idle_p95 = percentile(root_latencies_ms(), 95)
+        print(f"   Idle GET /api/ p95: {idle_p95:.1f}ms")
+        
+        deadline = time.perf_counter() + OVERLOAD_DURATION
+        with ThreadPoolExecutor(max_workers=OVERLOAD_CLIENTS) as pool:
+            futures = [pool.submit(api.labelled(saturate), index, deadline) for index in range(OVERLOAD_CLIENTS)]
+            loaded = root_latencies_ms(deadline)
+            outcomes = [outcome for future in futures for outcome in future.result()]
+        
+        statuses = Counter(status for status, _ in outcomes)
+        print(f"   Auth responses under overload: {dict(sorted(statuses.items()))}")
+        
+        unexpected = {status: count for status, count in statuses.items() if status not in (200, 401, 429)}
+        if unexpected:
+            print(f"   ❌ Overload reached the backend instead of being shed: {unexpected}")
+            cleanup_test_data()
+            return False
+        
+        if not statuses[429]:
+            print(f"   ⚠️  No 429s: all {len(outcomes)} auth requests were admitted; admission control "
+                  f"not available on this backend, skipping")
+            cleanup_test_data()
+            return True
+        
+        retry_after = [parse_retry_after(value) for status, value in outcomes if status == 429]
+        if None in retry_after:
+            print("   ❌ 429 response without a valid Retry-After header")
+            cleanup_test_data()
+            return False
+        
+        print(f"   ✅ {statuses[429]} auth requests shed with 429 and Retry-After")
+        
+        loaded_p95 = percentile(loaded, 95)
+        bound = idle_p95 * OVERLOAD_LATENCY_FACTOR + OVERLOAD_LATENCY_SLACK_MS
+        print(f"   GET /api/ p95 under overload: {loaded_p95:.1f}ms over {len(loaded)} requests "
+              f"(bound {bound:.1f}ms)")
+        if loaded_p95 > bound:
+            print("   ❌ Auth overload starved GET /api/")
+            cleanup_test_data()
+            return False
+        
+        print("   ✅ GET /api/ latency stayed bounded")
+        
+        time.sleep(min(max(retry_after), OVERLOAD_MAX_RETRY_AFTER))
+        response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": f"Bearer {session_token}"},
+            timeout=10
+        )
+        cleanup_test_data()
+        
+        if response.status_code != 200 or response.json().get("user_id") != user_id:
+            print(f"   ❌ Auth did not recover after Retry-After: {response.status_code}")
+            return False
+        
+        print("   ✅ Auth admitted again after Retry-After")
+        return True
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        cleanup_test_data()
+        return False
+
+# ============ PERFORMANCE GATE ============
+
+DEFAULT_RESULTS_PATH = "backend_test_results.json"
+DEFAULT_BASELINE_PATH = "backend_test_baseline.json"
+# A p95 increase must exceed both the relative threshold and this floor to count
+GATE_MIN_DELTA_MS = 5.0
+
+def parse_server_timing(header):
+    """Parse a Server-Timing header into {phase: milliseconds}, summing repeated phases
+
+    A metric whose dur can't be parsed is skipped; it never fails the request.
+    """
+    phases = {}
+    for metric in header.split(","):
+        name, *params = [part.strip() for part in metric.split(";")]
+        if not name:
+            continue
+        value = next((param[4:].strip().strip('"') for param in params if param.startswith("dur=")), None)
+        try:
+            duration = float(value) if value is not None else 0.0
+        except ValueError:
+            continue
+        if not math.isfinite(duration):
+            continue
+        phases[name] = phases.get(name, 0.0) + duration
+    return phases
+
+def server_timing_breakdown(timings):
+    """Mean milliseconds per Server-Timing phase, plus network time, for each endpoint"""
+    api_path = urlparse(API_BASE).path
+    grouped = {}
+    for timing in timings:
+        if timing.phases is not None and timing.path.startswith(api_path):
+            grouped.setdefault(endpoint_key(timing.method, timing.path[len(api_path):]), []).append(timing)
+    
+    breakdown = {}
+    for key, group in sorted(grouped.items()):
+        sums = {}
+        for timing in group:
+            for phase, duration in timing.phases.items():
+                sums[phase] = sums.get(phase, 0.0) + duration
+        means = {phase: round(total / len(group), 3) for phase, total in sums.items()}
+        if "total" in means:
+            client_ms = sum(timing.total for timing in group) * 1000 / len(group)
+            # Whatever the server didn't account for was spent on the wire or in the client
+            means["network"] = round(max(0.0, client_ms - means["total"]), 3)
+        breakdown[key] = means
+    return breakdown
+
+def print_server_timing(breakdown):
+    if not breakdown:
+        return
+    print("\n⏱️  SERVER TIMING (mean ms per request)")
+    for key, means in breakdown.items():
+        phases = "  ".join(f"{phase}={duration:.1f}" for phase, duration in means.items())
+        print(f"   {key}: {phases}")
+
+def build_results(results, durations, wall_clock, workers):
+    """Machine-readable summary of a test run: per-test and per-endpoint numbers"""
+    api_path = urlparse(API_BASE).path
+    timings = [timing for timing in list(api.timings) if timing.path.startswith(api_path)]
+    
+    tests = {}
+    for name, passed in results.items():
+        own = [timing for timing in timings if timing.test == name]
+        tests[name] = {
+            "passed": passed,
+            "duration": round(durations[name], 6),
+            "requests": len(own),
+            "db_round_trips": sum(timing.db_round_trips or 0 for timing in own),
+        }
+    
+    grouped = {}
+    for timing in timings:
+        grouped.setdefault(endpoint_key(timing.method, timing.path[len(api_path):]), []).append(timing)
+    
+    endpoints = {}
+    for key, group in sorted(grouped.items()):
+        ms = sorted(timing.total * 1000 for timing in group)
+        trips = [timing.db_round_trips for timing in group if timing.db_round_trips is not None]
+        endpoints[key] = {
+            "requests": len(group),
+            "p50_ms": round(percentile(ms, 50), 3),
+            "p95_ms": round(percentile(ms, 95), 3),
+            "p99_ms": round(percentile(ms, 99), 3),
+            "max_ms": round(ms[-1], 3),
+            "db_round_trips": sum(trips),
+            "db_round_trips_per_request": round(sum(trips) / len(trips), 3) if trips else None,
+        }
+    
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "api_base": API_BASE,
+        "workers": workers,
+        "wall_clock": round(wall_clock, 6),
+        "tests": tests,
+        "endpoints": endpoints,
+        "server_timing_ms": server_timing_breakdown(timings),
+    }
+
+def compare_to_baseline(current, baseline, threshold):
+    """List every p95 latency or DB round-trip regression beyond `threshold` (a fraction)"""
+    regressions = []
+    
+    for key, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(key)
+        if not before:
+            continue
+        
+        limit = before["p95_ms"] * (1 + threshold)
+        if now["p95_ms"] > limit and now["p95_ms"] - before["p95_ms"] > GATE_MIN_DELTA_MS:
+            regressions.append(f"{key}: p95 {before['p95_ms']:.1f}ms -> {now['p95_ms']:.1f}ms")
+        
+        old_trips = before.get("db_round_trips_per_request")
+        new_trips = now.get("db_round_trips_per_request")
+        if old_trips is not None and new_trips is not None and new_trips > old_trips * (1 + threshold):
+            regressions.append(f"{key}: DB round trips/request {old_trips} -> {new_trips}")
+    
+    for name, now in current["tests"].items():
+        before = baseline.get("tests", {}).get(name)
+        if before and now["db_round_trips"] > before["db_round_trips"] * (1 + threshold):
+            regressions.append(f"{name}: DB round trips {before['db_round_trips']} -> {now['db_round_trips']}")
+    
+    return regressions
+
+def write_junit(path, current, regressions):
+    """Write the test results, plus one perf-gate case per regression, as JUnit XML"""
+    suite = ElementTree.Element(
+        "testsuite",
+        name="NotePilot backend",
+        tests=str(len(current["tests"]) + 1),
+        failures=str(sum(not test["passed"] for test in current["tests"].values()) + bool(regressions)),
+        time=f"{current['wall_clock']:.3f}",
+        timestamp=current["generated_at"],
+    )
+    
+    for name, test in current["tests"].items():
+        case = ElementTree.SubElement(suite, "testcase", classname="backend_test", name=name,
+                                      time=f"{test['duration']:.3f}")
+        if not test["passed"]:
+            ElementTree.SubElement(case, "failure", message=f"{name} failed")
+    
+    gate = ElementTree.SubElement(suite, "testcase", classname="backend_test.perf_gate",
+                                  name="Performance regression gate", time="0")
+    if regressions:
+        failure = ElementTree.SubElement(gate, "failure", message=f"{len(regressions)} regressions")
+        failure.text = "\n".join(regressions)
+    
+    ElementTree.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+def run_perf_gate(current, results_path, baseline_path, threshold, update_baseline):
+    """Write this run's results, compare them with the baseline and report regressions"""
+    with open(results_path, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"📝 Results written to {results_path}")
+    
+    regressions = []
+    try:
+        with open(baseline_path, "r") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"   ⚠️  No baseline at {baseline_path}; run with --update-baseline to store one")
+    else:
+        regressions = compare_to_baseline(current, baseline, threshold)
+        if regressions:
+            print(f"❌ Performance regressions beyond {threshold:.0%} vs {baseline_path}:")
+            for regression in regressions:
+                print(f"   {regression}")
+        else:
+            print(f"✅ No regressions beyond {threshold:.0%} vs {baseline_path}")
+    
+    if update_baseline:
+        if all(test["passed"] for test in current["tests"].values()):
+            with open(baseline_path, "w") as f:
+                json.dump(current, f, indent=2)
+            print(f"📌 Baseline updated at {baseline_path}")
+        else:
+            print("   ⚠️  Not updating the baseline from a failing run")
+    
+    return regressions
+
+def test_server_timing():
+    """Test Server-Timing breakdowns and the per-route metrics endpoint"""
+    print("\n🧪 Testing Server-Timing header and GET /api/metrics")
+    
+    user_id, session_token, email = create_test_user_and_session()
+    
+    if not session_token:
+        print("   ❌ Failed to create test data")
+        return False
+    
+    try:
+        before = api.get(f"{API_BASE}/metrics")
+        if route_missing(before, "GET /api/metrics"):
+            cleanup_test_data()
+            return True
+        if before.status_code != 200:
+            print(f"   ❌ Metrics endpoint failed: {before.status_code}")
+            cleanup_test_data()
+            return False
+        count_before = before.json().get("routes", {}).get("GET /api/auth/me", {}).get("count", 0)
+        
+        response = api.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": f"Bearer {session_token}"}
+        )
+        cleanup_test_data()
+        
+        header = response.headers.get("Server-Timing")
+        print(f"   Server-Timing: {header}")
+        if response.status_code != 200 or not header:
+            print(f"   ❌ Missing Server-Timing on authenticated request ({response.status_code})")
+            return False
+        
+        phases = parse_server_timing(header)
+        missing = [phase for phase in ["db", "total"] if phase not in phases]
+        if missing:
+            print(f"   ❌ Server-Timing missing phases: {missing}")
+            return False
+        
+        client_ms = response.timing.total * 1000
+        if phases["total"] > client_ms:
+            print(f"   ❌ Server total {phases['total']:.1f}ms exceeds client time {client_ms:.1f}ms")
+            return False
+        
+        print(f"   ✅ Breakdown: db {phases['db']:.1f}ms of {phases['total']:.1f}ms server, "
+              f"{client_ms:.1f}ms client")
+        
+        after = api.get(f"{API_BASE}/metrics").json()
+        route = after.get("routes", {}).get("GET /api/auth/me", {})
+        if route.get("count", 0) <= count_before:
+            print(f"   ❌ Metrics did not count the request: {route}")
+            return False
+        
+        print(f"   ✅ Metrics histogram for GET /api/auth/me has {route['count']} requests")
+        return True
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        cleanup_test_data()
+        return False
+
+# ============ PROFILING ============
+
+PROFILE_MODES = ("sample", "cprofile")
+# Set with --profile: every test or benchmark phase is wrapped in a ProfileCapture
+PROFILE_MODE = None
+PROFILE_ROUTE = None
+PROFILE_DIR = "profiles"
+DEBUG_TOKEN_HEADER = "X-Debug-Token"
+
+def get_debug_token():
+    """Token guarding the backend's /api/debug endpoints, None when profiling is disabled"""
+    return get_backend_settings({"DEBUG_PROFILE_TOKEN": None})["DEBUG_PROFILE_TOKEN"] or None
+
+def write_profile(name, profile, directory):
+    """Write a stopped profile as flamegraph-ready files, returning their paths
+
+    Sampled stacks go to <name>.collapsed (flamegraph.pl, speedscope, inferno);
+    cProfile output goes to <name>.pstats.txt and a binary <name>.prof for
+    snakeviz or flameprof.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_").lower())
+    paths = []
+    for key, suffix in (("collapsed", ".collapsed"), ("pstats", ".pstats.txt")):
+        if profile.get(key):
+            with open(stem + suffix, "w") as f:
+                f.write(profile[key])
+            paths.append(stem + suffix)
+    if profile.get("pstats_dump"):
+        with open(stem + ".prof", "wb") as f:
+            f.write(base64.b64decode(profile["pstats_dump"]))
+        paths.append(stem + ".prof")
+    return paths
+
+class ProfileCapture:
+    """Profile the backend while a block runs, then write the result files
+
+    The backend profiles the whole process, or only `route` ("GET /api/auth/me")
+    when given, so concurrent tests show up in each other's captures; use
+    --serial for clean per-test profiles.
+    """
+
+    def __init__(self, name, mode="sample", route=None, directory=PROFILE_DIR):
+        self.name = name
+        self.mode = mode
+        self.route = route
+        self.directory = directory
+        self.profile_id = None
+        self.paths = []
+
+    def __enter__(self):
+        response = api.post(
+            f"{API_BASE}/debug/profile/start",
+            json={"mode": self.mode, "route": self.route},
+            headers={DEBUG_TOKEN_HEADER: get_debug_token() or ""},
+            timeout=10
+        )
+        if response.status_code == 200:
+            self.profile_id = response.json()["profile_id"]
+        else:
+            print(f"   ⚠️  Profiling {self.name} not started: {response.status_code}")
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profile_id:
+            response = api.post(
+                f"{API_BASE}/debug/profile/{self.profile_id}/stop",
+                headers={DEBUG_TOKEN_HEADER: get_debug_token() or ""},
+                timeout=30
+            )
+            if response.status_code == 200:
+                self.paths = write_profile(self.name, response.json(), self.directory)
+                print(f"   🔥 Profile written to {', '.join(self.paths)}")
+            else:
+                print(f"   ⚠️  Profiling {self.name} not stopped: {response.status_code}")
+        return False
+
+def profile_capture(name):
+    """A ProfileCapture for `name` when --profile is on, otherwise a no-op"""
+    if not PROFILE_MODE:
+        return contextlib.nullcontext()
+    return ProfileCapture(name, PROFILE_MODE, PROFILE_ROUTE, PROFILE_DIR)
+
+def test_debug_profiling():
+    """Test the profiling endpoints are guarded and return usable profiles"""
+    print("\n🧪 Testing /api/debug/profile guard and capture")
+    
+    try:
+        for label, token in (("no token", None), ("a wrong token", uuid.uuid4().hex)):
+            headers = {DEBUG_TOKEN_HEADER: token} if token else {}
+            response = api.post(f"{API_BASE}/debug/profile/start", json={"mode": "sample"},
+                                headers=headers, timeout=10)
+            if route_missing(response, "POST /api/debug/profile/start"):
+                return True
+            if response.status_code not in (401, 403):
+                print(f"   ❌ Profiling not refused with {label}: {response.status_code}")
+                return False
+        
+        print("   ✅ Profiling refused without the debug token")
+        
+        if not get_debug_token():
+            print("   ⚠️  No DEBUG_PROFILE_TOKEN in the environment or backend/.env, skipping capture")
+            return True
+        
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in PROFILE_MODES:
+                with ProfileCapture(f"debug {mode}", mode, "GET /api/status", directory) as capture:
+                    for _ in range(5):
+                        api.get(f"{API_BASE}/status", params={"limit": STATUS_MAX_PAGE_SIZE}, timeout=10)
+                if not capture.paths:
+                    print(f"   ❌ {mode} capture produced no output")
+                    return False
+                if mode == "sample":
+                    with open(capture.paths[0], "r") as f:
+                        lines = f.read().splitlines()
+                    malformed = [line for line in lines if not re.fullmatch(r"\S.* \d+", line)]
+                    if not lines or malformed:
+                        print(f"   ❌ Collapsed stacks malformed: {malformed[:3]}")
+                        return False
+                print(f"   ✅ {mode} capture: {', '.join(os.path.basename(path) for path in capture.paths)}")
+        
+        return True
+            
+    except Exception as e:
+        print(f"   ❌ Error: {e}")
+        return False
+
+# ============ TEST RUNNER ============
+
+# A test may start once every test named in depends_on has finished. Tests that
+# list the same fixture never overlap: cleanup_test_data() removes every test
+# user and session of the run, so two tests sharing "test_users" would clobber
+# each other. Shards are separate runs with their own namespace, so only the
+# fixtures in NAMESPACED_FIXTURES may be held by two shards at once.
+# Tests holding "backend_load" saturate the backend or bound its latency, so
+# they must not overlap in any shard. Tests holding a fixture in
+# UNSHARDED_FIXTURES run after every shard has finished: "auth_rate_limit"
+# exhausts the per-client token bucket every auth test shares.
+TestSpec = namedtuple("TestSpec", ["name", "func", "depends_on", "fixtures"], defaults=((), ()))
+
+NAMESPACED_FIXTURES = frozenset({"test_users"})
+UNSHARDED_FIXTURES = frozenset({"auth_rate_limit"})
+
+TESTS = [
+    TestSpec("Root Endpoint", test_root_endpoint),
+    TestSpec("POST Status Endpoint", test_post_status_endpoint),
+    TestSpec("POST Status Error Handling", test_post_status_error_handling),
+    TestSpec("GET Status Endpoint", test_get_status_endpoint),
+    TestSpec("Data Persistence", test_data_persistence,
+             depends_on=("POST Status Endpoint", "GET Status Endpoint")),
+    TestSpec("Status Pagination", test_status_pagination, depends_on=("GET Status Endpoint",)),
+    TestSpec("Status NDJSON Stream", test_status_ndjson_stream, depends_on=("GET Status Endpoint",)),
+    TestSpec("Status Batch Insert", test_status_batch_insert, depends_on=("Data Persistence",)),
+    TestSpec("Status Stats", test_status_stats, depends_on=("POST Status Endpoint",)),
+    TestSpec("Status Conditional GET", test_status_conditional_get, depends_on=("GET Status Endpoint",)),
+    TestSpec("MongoDB Index Plans", test_index_plans),
+    TestSpec("Health Probes", test_health_probes, fixtures=("backend_load",)),
+    TestSpec("Debug Profiling", test_debug_profiling),
+    TestSpec("Study Pack Generation", test_study_pack_generation),
+    # Resets the generator stub's counters too, so never alongside the study pack test
+    TestSpec("Chat SSE Stream", test_chat_stream, depends_on=("Study Pack Generation",),
+             fixtures=("backend_load",)),
+    TestSpec("OAuth - Session Exchange", test_oauth_session_exchange),
+    TestSpec("OAuth - Stub Session Exchange", test_oauth_stub_session_exchange, fixtures=("test_users",)),
+    TestSpec("OAuth - Upstream Client", test_oauth_upstream_client, fixtures=("test_users",)),
+    TestSpec("OAuth - Auth Me Endpoint", test_oauth_auth_me, fixtures=("test_users",)),
+    TestSpec("OAuth - Logout Endpoint", test_oauth_logout,
+             depends_on=("OAuth - Auth Me Endpoint",), fixtures=("test_users",)),
+    TestSpec("OAuth - Error Scenarios", test_oauth_error_scenarios, fixtures=("test_users",)),
+    TestSpec("OAuth - Session Cache", test_auth_session_cache, fixtures=("test_users",)),
+    TestSpec("OAuth - Single Round Trip", test_auth_single_round_trip, fixtures=("test_users",)),
+    TestSpec("Server-Timing Breakdown", test_server_timing, fixtures=("test_users",)),
+    TestSpec("OAuth - Auth Me Conditional GET", test_auth_me_conditional_get, fixtures=("test_users",)),
+    TestSpec("OAuth - Signed Session Tokens", test_signed_session_tokens, fixtures=("test_users",)),
+    # Saturates the client's rate limit; every other auth test must be done or held off
+    TestSpec("Auth Overload Backpressure", test_auth_overload, depends_on=("OAuth - Session Exchange",),
+             fixtures=("test_users", "backend_load", "auth_rate_limit")),
+]
+
+DEFAULT_WORKERS = 4
+
+class ThreadOutput:
+    """sys.stdout proxy that buffers each worker's prints until its test finishes"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def begin(self):
+        self._local.buffer = io.StringIO()
+
+    def end(self):
+        text = self._local.buffer.getvalue()
+        self._local.buffer = None
+        return text
+
+    def write(self, text):
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer or self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+def run_timed(output, spec):
+    """Run one test with its output captured, returning (passed, seconds, output)"""
+    output.begin()
+    api.label(spec.name)
+    start = time.perf_counter()
+    try:
+        with profile_capture(spec.name):
+            passed = bool(spec.func())
+    except Exception as e:
+        print(f"   ❌ Test {spec.name} crashed: {e}")
+        passed = False
+    elapsed = time.perf_counter() - start
+    api.label(None)
+    return passed, elapsed, output.end()
+
+def run_test_plan(tests, workers=DEFAULT_WORKERS):
+    """Run tests on a thread pool honouring dependencies and shared fixtures"""
+    names = {spec.name for spec in tests}
+    for spec in tests:
+        unknown = [dep for dep in spec.depends_on if dep not in names]
+        if unknown:
+            raise ValueError(f"{spec.name} depends on unknown tests: {unknown}")
+    
+    results = {}
+    durations = {}
+    pending = list(tests)
+    running = {}
+    held_fixtures = set()
+    output = ThreadOutput(sys.stdout)
+    sys.stdout = output
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while pending or running:
+                for spec in list(pending):
+                    if len(running) >= workers:
+                        break
+                    if not all(dep in results for dep in spec.depends_on):
+                        continue
+                    if held_fixtures.intersection(spec.fixtures):
+                        continue
+                    pending.remove(spec)
+                    held_fixtures.update(spec.fixtures)
+                    running[pool.submit(run_timed, output, spec)] = spec
+                
+                if not running:
+                    # Only reachable with a dependency cycle
+                    for spec in pending:
+                        print(f"   ❌ Test {spec.name} has unsatisfiable dependencies: {spec.depends_on}")
+                        results[spec.name] = False
+                        durations[spec.name] = 0.0
+                    break
+                
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    spec = running.pop(future)
+                    held_fixtures.difference_update(spec.fixtures)
+                    passed, elapsed, text = future.result()
+                    output.stream.write(text)
+                    results[spec.name] = passed
+                    durations[spec.name] = elapsed
+    finally:
+        sys.stdout = output.stream
+    
+    return results, durations
+
+def shard_tests(tests, shards):
+    """Split tests into at most `shards` groups
+
+    Each dependency chain stays in one group, and so do all holders of a
+    fixture that is shared across namespaces, so they still never overlap.
+    Holders of UNSHARDED_FIXTURES are left out; run_sharded() runs them last.
+    """
+    tests = [spec for spec in tests if not UNSHARDED_FIXTURES.intersection(spec.fixtures)]
+    parent = {spec.name: spec.name for spec in tests}
+    
+    def root(name):
+        while parent[name] != name:
+            name = parent[name]
+        return name
+    
+    holders = {}
+    for spec in tests:
+        for dep in spec.depends_on:
+            parent[root(dep)] = root(spec.name)
+        for fixture in set(spec.fixtures) - NAMESPACED_FIXTURES:
+            holder = holders.setdefault(fixture, spec.name)
+            parent[root(holder)] = root(spec.name)
+    
+    chains = {}
+    for spec in tests:
+        chains.setdefault(root(spec.name), []).append(spec)
+    
+    # Longest chains first, each onto the emptiest shard; fixture users spread out
+    groups = [[] for _ in range(max(1, shards))]
+    for chain in sorted(chains.values(), key=lambda chain: (-len(chain), tests.index(chain[0]))):
+        min(groups, key=lambda group: (sum(1 for spec in group if spec.fixtures), len(group))).extend(chain)
+    
+    order = {spec.name: index for index, spec in enumerate(tests)}
+    return [sorted(group, key=lambda spec: order[spec.name]) for group in groups if group]
+
+def run_shard(tests, workers, output_path):
+    """Run one shard in this process and write its results for the parent to merge"""
+    results, durations = run_test_plan(tests, workers)
+    with open(output_path, "w") as f:
+        json.dump({
+            "results": results,
+            "durations": durations,
+            "connections": api.connections,
+            "timings": [timing._asdict() for timing in api.timings],
+        }, f)
+    return all(results.values())
+
+def run_sharded(tests, shards, workers):
+    """Run each shard in its own process and namespace, merging results and request timings
+
+    Tests holding an UNSHARDED_FIXTURES fixture run here afterwards, once
+    every shard has finished.
+    """
+    after = [spec for spec in tests if UNSHARDED_FIXTURES.intersection(spec.fixtures)]
+    groups = shard_tests(tests, shards)
+    print(f"🧩 {len(groups)} shards of {', '.join(str(len(group)) for group in groups)} tests, "
+          f"{workers} workers each{f', then {len(after)} unsharded' if after else ''}")
+    
+    with tempfile.TemporaryDirectory(prefix="backend_test_shards_") as tmp:
+        children = []
+        for index in range(len(groups)):
+            output_path = os.path.join(tmp, f"shard_{index}.json")
+            command = [sys.executable, os.path.abspath(__file__), "--shards", str(len(groups)),
+                       "--shard", str(index), "--shard-output", output_path, "--workers", str(workers)]
+            if AUTH_STUB_URL:
+                command += ["--auth-stub", AUTH_STUB_URL]
+            if GENERATOR_STUB_URL:
+                command += ["--generator-stub", GENERATOR_STUB_URL]
+            if PROFILE_MODE:
+                command += ["--profile", PROFILE_MODE, "--profile-dir", PROFILE_DIR]
+                if PROFILE_ROUTE:
+                    command += ["--profile-route", PROFILE_ROUTE]
+            env = dict(os.environ, TEST_RUN_ID=f"{RUN_ID}-{index}")
+            log = open(os.path.join(tmp, f"shard_{index}.log"), "w+")
+            children.append((subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=env),
+                             log, output_path))
+        
+        results = {}
+        durations = {}
+        for index, (child, log, output_path) in enumerate(children):
+            child.wait()
+            log.seek(0)
+            sys.stdout.write(log.read())
+            log.close()
+            try:
+                with open(output_path, "r") as f:
+                    shard = json.load(f)
+            except (OSError, ValueError):
+                print(f"   ❌ Shard {index} exited with {child.returncode} before reporting")
+                for spec in groups[index]:
+                    results[spec.name] = False
+                    durations[spec.name] = 0.0
+                continue
+            results.update(shard["results"])
+            durations.update(shard["durations"])
+            api.timings.extend(RequestTiming(**timing) for timing in shard["timings"])
+            api.connections += shard["connections"]
+    
+    if after:
+        # Their dependencies outside `after` ran in the shards
+        names = {spec.name for spec in after}
+        after_results, after_durations = run_test_plan(
+            [spec._replace(depends_on=tuple(dep for dep in spec.depends_on if dep in names)) for spec in after],
+            workers)
+        results.update(after_results)
+        durations.update(after_durations)
+    
+    return results, durations
+
+def run_all_tests(workers=DEFAULT_WORKERS, results_path=DEFAULT_RESULTS_PATH,
+                  baseline_path=DEFAULT_BASELINE_PATH, threshold=0.2, junit_path=None,
+                  update_baseline=False, shards=1):
+    """Run all backend tests, then gate on performance against the stored baseline"""
+    print("🚀 Starting NotePilot Backend API Tests")
+    print("=" * 50)
+    
+    tests = TESTS
+    
+    wall_start = time.perf_counter()
+    if shards > 1:
+        results, durations = run_sharded(tests, shards, workers)
+    else:
+        results, durations = run_test_plan(tests, workers)
+    wall_clock = time.perf_counter() - wall_start
+    
+    print("\n" + "=" * 50)
+    print("📊 TEST RESULTS SUMMARY")
+    print("=" * 50)
+    
+    passed = 0
+    total = len(tests)
+    
+    for spec in tests:
+        result = results[spec.name]
+        status = "✅ PASS" if result else "❌ FAIL"
+        print(f"{status} - {spec.name} ({durations[spec.name]:.2f}s)")
+        if result:
+            passed += 1
+    
+    print(f"\nOverall: {passed}/{total} tests passed")
+    print(f"⏱️  Wall-clock: {wall_clock:.2f}s "
+          f"(sum of test durations {sum(durations.values()):.2f}s, {workers} workers"
+          f"{f' x {shards} shards' if shards > 1 else ''})")
+    print(f"🌐 HTTP: {api.summary()}")
+    
+    ordered = {spec.name: results[spec.name] for spec in tests}
+    current = build_results(ordered, durations, wall_clock, workers)
+    print_server_timing(current["server_timing_ms"])
+    regressions = run_perf_gate(current, results_path, baseline_path, threshold, update_baseline)
+    if junit_path:
+        write_junit(junit_path, current, regressions)
+        print(f"📝 JUnit report written to {junit_path}")
+    
+    if passed == total and not regressions:
+        print("🎉 All backend tests PASSED!")
+        return True
+    elif passed == total:
+        print("⚠️  All backend tests passed, but performance REGRESSED!")
+        return False
+    else:
+        print("⚠️  Some backend tests FAILED!")
+        return False
+
+# ============ BENCHMARK MODE ============
+
+BENCH_LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+BENCH_DEFAULT_SESSIONS = 2000
+# Status checks per POST /api/status/batch request; set with --batch-size
+BENCH_BATCH_SIZE = 50
+
+BenchResult = namedtuple("BenchResult", ["label", "latencies", "errors", "elapsed", "items", "shed"],
+                         defaults=(1, 0))
+
+class BenchSessions:
+    """Session tokens for the auth benchmarks: one shared, the rest consumed by logout"""
+
+    def __init__(self, tokens):
+        self.shared = tokens[0] if tokens else None
+        self._disposable = list(tokens[1:])
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            return self._disposable.pop() if self._disposable else None
+
+def create_bench_sessions(count):
+    """Create one test user with `count` sessions in a single bulk write"""
+    print(f"   📝 Creating {count} benchmark sessions in MongoDB...")
+    
+    suffix = fixture_suffix()
+    user_id = f"test-user-bench-{suffix}"
+    tokens = [f"test_session_bench_{suffix}_{i}" for i in range(count)]
+    
+    try:
+        get_fixture_store().seed(
+            users=[make_test_user(user_id, f"test.user.bench.{suffix}@example.com", "Test User Bench")],
+            sessions=[make_test_session(user_id, token) for token in tokens],
+        )
+        print(f"   ✅ Created {count} sessions for {user_id}")
+        return tokens
+            
+    except Exception as e:
+        print(f"   ❌ Error creating benchmark sessions: {e}")
+        return []
+
+def bench_get_root(sessions):
+    return api.get(f"{API_BASE}/", timeout=10)
+
+def bench_post_status(sessions):
+    return api.post(
+        f"{API_BASE}/status",
+        json={"client_name": "NotePilot_Bench_Client"},
+        timeout=10
+    )
+
+def bench_post_status_batch(sessions):
+    return api.post(
+        f"{API_BASE}/status/batch",
+        json=[{"client_name": "NotePilot_Bench_Client"}] * BENCH_BATCH_SIZE,
+        timeout=10
+    )
+
+def bench_get_status(sessions):
+    return api.get(f"{API_BASE}/status", timeout=10)
+
+def bench_auth_me_header(sessions):
+    return api.get(
+        f"{API_BASE}/auth/me",
+        headers={"Authorization": f"Bearer {sessions.shared}"},
+        timeout=10
+    )
+
+def bench_auth_me_cookie(sessions):
+    return api.get(
+        f"{API_BASE}/auth/me",
+        cookies={"session_token": sessions.shared},
+        timeout=10
+    )
+
+def bench_logout(sessions):
+    # Every logout burns a session; returning None stops the phase once they run out
+    token = sessions.take()
+    if token is None:
+        return None
+    return api.post(
+        f"{API_BASE}/auth/logout",
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=10
+    )
+
+def bench_session_exchange(sessions):
+    # Each exchange mints a new stub user session, removed by cleanup_test_data()
+    return api.post(
+        f"{API_BASE}/auth/session",
+        json={"session_id": f"stub-{uuid.uuid4().hex}"},
+        timeout=30
+    )
+
+# key -> (label, request function, needs sessions)
+BENCH_ENDPOINTS = {
+    "root": ("GET /api/", bench_get_root, False),
+    "post-status": ("POST /api/status", bench_post_status, False),
+    "post-status-batch": ("POST /api/status/batch", bench_post_status_batch, False),
+    "get-status": ("GET /api/status", bench_get_status, False),
+    "me-header": ("GET /api/auth/me (header)", bench_auth_me_header, True),
+    "me-cookie": ("GET /api/auth/me (cookie)", bench_auth_me_cookie, True),
+    "logout": ("POST /api/auth/logout", bench_logout, True),
+    "session-exchange": ("POST /api/auth/session (stub)", bench_session_exchange, False),
+}
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def run_bench_phase(label, func, sessions, concurrency, duration, max_requests, items=1):
+    """Drive one endpoint from `concurrency` threads until the duration or request budget runs out"""
+    latencies = []
+    errors = [0]
+    shed = [0]
+    issued = [0]
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = None if max_requests else start + duration
+    
+    def worker():
+        while True:
+            with lock:
+                if max_requests and issued[0] >= max_requests:
+                    return
+                issued[0] += 1
+            if deadline and time.perf_counter() >= deadline:
+                return
+            
+            request_start = time.perf_counter()
+            try:
+                response = func(sessions)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            if response is None:
+                return
+            latency = time.perf_counter() - request_start
+            
+            with lock:
+                latencies.append(latency)
+                # Load shedding is the backend working as intended, not a failure
+                if response.status_code == 429:
+                    shed[0] += 1
+                elif response.status_code != 200:
+                    errors[0] += 1
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    
+    return BenchResult(label, sorted(latencies), errors[0], time.perf_counter() - start, items, shed[0])
+
+def print_bench_result(result):
+    """Print throughput, latency percentiles and a histogram for one endpoint"""
+    count = len(result.latencies)
+    throughput = count / result.elapsed if result.elapsed else 0.0
+    print(f"\n📈 {result.label}")
+    print(f"   Requests: {count}  Errors: {result.errors}  "
+          f"Throughput: {throughput:.1f} req/s over {result.elapsed:.2f}s")
+    if result.shed:
+        print(f"   Shed: {result.shed} requests answered 429 by admission control")
+    if result.items > 1:
+        print(f"   Items: {result.items} per request, {throughput * result.items:.1f} items/s")
+    
+    if not count:
+        print("   ⚠️  No completed requests")
+        return
+    
+    ms = [latency * 1000 for latency in result.latencies]
+    print(f"   Latency ms: p50={percentile(ms, 50):.1f}  p90={percentile(ms, 90):.1f}  "
+          f"p99={percentile(ms, 99):.1f}  max={ms[-1]:.1f}")
+    
+    counts = [0] * (len(BENCH_LATENCY_BUCKETS_MS) + 1)
+    for value in ms:
+        index = 0
+        while index < len(BENCH_LATENCY_BUCKETS_MS) and value > BENCH_LATENCY_BUCKETS_MS[index]:
+            index += 1
+        counts[index] += 1
+    
+    peak = max(counts)
+    lower = 0
+    for index, bucket_count in enumerate(counts):
+        if bucket_count:
+            upper = (f"{BENCH_LATENCY_BUCKETS_MS[index]}ms" if index < len(BENCH_LATENCY_BUCKETS_MS)
+                     else "inf")
+            bar = "█" * max(1, round(40 * bucket_count / peak))
+            print(f"   {f'{lower}-{upper}':>12} | {bar} {bucket_count}")
+        if index < len(BENCH_LATENCY_BUCKETS_MS):
+            lower = BENCH_LATENCY_BUCKETS_MS[index]
+
+def run_benchmarks(endpoints, concurrency, duration, max_requests, session_count):
+    """Benchmark each endpoint in turn and print per-endpoint latency reports"""
+    print("🏎️  Starting NotePilot Backend Benchmark")
+    print("=" * 50)
+    if max_requests:
+        print(f"   {max_requests} requests per endpoint, concurrency {concurrency}")
+    else:
+        print(f"   {duration}s per endpoint, concurrency {concurrency}")
+    
+    if "session-exchange" in endpoints and not AUTH_STUB_URL:
+        print("   ⚠️  Skipping session-exchange: it needs --auth-stub")
+        endpoints = [key for key in endpoints if key != "session-exchange"]
+    
+    sessions = BenchSessions([])
+    if any(BENCH_ENDPOINTS[key][2] for key in endpoints):
+        if "logout" in endpoints and max_requests:
+            session_count = max(session_count, max_requests + 1)
+        sessions = BenchSessions(create_bench_sessions(session_count))
+        if sessions.shared is None:
+            print("   ❌ Failed to create benchmark sessions")
+            return False
+    
+    results = []
+    try:
+        for key in endpoints:
+            label, func, _ = BENCH_ENDPOINTS[key]
+            items = BENCH_BATCH_SIZE if key == "post-status-batch" else 1
+            print(f"\n🧪 Benchmarking {label}...")
+            with profile_capture(f"bench {label}"):
+                results.append(run_bench_phase(label, func, sessions, concurrency, duration, max_requests, items))
+    finally:
+        if sessions.shared is not None or "session-exchange" in endpoints:
+            cleanup_test_data()
+    
+    print("\n" + "=" * 50)
+    print("📊 BENCHMARK RESULTS")
+    print("=" * 50)
+    for result in results:
+        print_bench_result(result)
+    print(f"\n🌐 HTTP: {api.summary()}")
+    print_server_timing(server_timing_breakdown(list(api.timings)))
+    
+    return all(result.latencies and not result.errors for result in results)
+
+# ============ SERIALIZATION BENCHMARK ============
+
+SERIALIZATION_SIZES = (1000, 10000, 100000)
+SERIALIZATION_REPEATS = 3
+
+def make_status_documents(count):
+    """Status checks as a projected find() returns them: no _id, naive UTC datetimes"""
+    start = datetime(2026, 1, 1)
+    return [
+        {"id": str(uuid.uuid4()), "client_name": f"client_{index % 50}", "timestamp": start + timedelta(seconds=index)}
+        for index in range(count)
+    ]
+
+def serialization_paths():
+    """(label, serialize) for the response paths under comparison, or None if a dependency is missing
+
+    The first path is what FastAPI does for response_model=List[StatusCheck]:
+    build a model per document, jsonable_encoder, then json.dumps. The last is
+    the fast path: projected documents handed straight to orjson.
+    """
+    try:
+        import orjson
+        from fastapi.encoders import jsonable_encoder
+        from pydantic import BaseModel
+    except ImportError as e:
+        print(f"❌ The serialization benchmark needs the backend's dependencies: {e}")
+        return None
+    
+    class StatusCheck(BaseModel):
+        id: str
+        client_name: str
+        timestamp: datetime
+    
+    def dumps(content):
+        # Exactly how starlette's JSONResponse renders
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                          separators=(",", ":")).encode("utf-8")
+    
+    return [
+        ("models + json", lambda docs: dumps(jsonable_encoder([StatusCheck(**doc) for doc in docs]))),
+        ("projected + json", lambda docs: dumps(jsonable_encoder(docs))),
+        ("projected + orjson", orjson.dumps),
+    ]
+
+def measure_serialization(serialize, docs):
+    """Best-of-N CPU seconds and the peak traced memory in bytes of one serialization"""
+    cpu = []
+    for _ in range(SERIALIZATION_REPEATS):
+        start = time.process_time()
+        serialize(docs)
+        cpu.append(time.process_time() - start)
+    
+    # Traced separately: tracemalloc slows allocation-heavy code down
+    tracemalloc.start()
+    try:
+        serialize(docs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(cpu), peak
+
+def run_serialization_bench(sizes):
+    """Compare status check serialization paths for CPU time and peak memory"""
+    print("🧮 Starting NotePilot Serialization Benchmark")
+    print("=" * 50)
+    
+    paths = serialization_paths()
+    if paths is None:
+        return False
+    
+    sample = make_status_documents(100)
+    reference = json.loads(paths[0][1](sample))
+    for label, serialize in paths[1:]:
+        if json.loads(serialize(sample)) != reference:
+            print(f"❌ {label} output differs from the current response")
+            return False
+    print("   ✅ Every path renders the same JSON")
+    
+    for count in sizes:
+        docs = make_status_documents(count)
+        print(f"\n📈 {count} status checks")
+        baseline_cpu = None
+        for label, serialize in paths:
+            cpu, peak = measure_serialization(serialize, docs)
+            baseline_cpu = baseline_cpu or cpu
+            speedup = baseline_cpu / cpu if cpu else float("inf")
+            print(f"   {label:<20} CPU {cpu * 1000:9.1f}ms  ({speedup:5.1f}x)  "
+                  f"peak memory {peak / 1024 / 1024:8.1f}MB  "
+                  f"{count / cpu if cpu else float('inf'):12,.0f} docs/s")
+    
+    return True
+
+# ============ DURABILITY CHECK ============
+
+def wait_for_backend(timeout=60):
+    """Poll GET /api/ until the backend answers, returning seconds waited or None"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if api.get(f"{API_BASE}/", timeout=2).status_code == 200:
+                return time.perf_counter() - start
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return None
+
+def run_durability_check(restart_cmd, writes, concurrency):
+    """Restart the backend mid-burst and verify every acknowledged write survived
+
+    A 200 from POST /api/status promises durability, including when the
+    backend buffers writes behind the response, so any acknowledged id missing
+    after a graceful restart is a lost write.
+    """
+    print("💾 Starting NotePilot Write Durability Check")
+    print("=" * 50)
+    print(f"   {writes} writes, concurrency {concurrency}, restart: {restart_cmd}")
+    
+    run_id = uuid.uuid4().hex[:8]
+    acknowledged = []
+    failed = [0]
+    lock = threading.Lock()
+    
+    def write(index):
+        try:
+            response = api.post(
+                f"{API_BASE}/status",
+                json={"client_name": f"DurabilityTest_{run_id}_{index}"},
+                timeout=30
+            )
+        except requests.RequestException:
+            response = None
+        with lock:
+            if response is not None and response.status_code == 200:
+                acknowledged.append(response.json()["id"])
+            else:
+                failed[0] += 1
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(write, index) for index in range(writes)]
+        # Restart once the first half of the writes have completed, while the rest are queued or in flight
+        wait(futures[:writes // 2])
+        print("   🔄 Restarting backend...")
+        restart = subprocess.run(restart_cmd, shell=True, capture_output=True, text=True)
+        if restart.returncode != 0:
+            print(f"   ⚠️  Restart command exited {restart.returncode}: {restart.stderr.strip()}")
+        wait(futures)
+    elapsed = time.perf_counter() - start
+    
+    downtime = wait_for_backend()
+    if downtime is None:
+        print("   ❌ Backend did not come back after restart")
+        return False
+    
+    print(f"   ✅ {len(acknowledged)} writes acknowledged, {failed[0]} rejected "
+          f"in {elapsed:.2f}s ({len(acknowledged) / elapsed:.1f} writes/s)")
+    
+    lost = [status_id for status_id in acknowledged
+            if api.get(f"{API_BASE}/status/{status_id}").status_code != 200]
+    
+    if lost:
+        print(f"   ❌ {len(lost)} acknowledged writes lost, e.g. {lost[:5]}")
+        return False
+    
+    print("   ✅ No acknowledged writes lost across the restart")
+    return True
+
+# ============ SOAK TEST ============
+
+SOAK_STEPS = ["me-header", "me-cookie", "logout"]
+# Growth that counts as a leak once it is sustained across the run
+SOAK_LEAK_THRESHOLDS = {"rss_mb": 20.0, "fds": 10, "mongo_connections": 10}
+# Latency samples kept per step for the rolling p95
+SOAK_LATENCY_WINDOW = 500
+
+def find_backend_pid(pattern):
+    """First process (other than this one) whose command line contains `pattern`"""
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        if pattern in cmdline:
+            return int(entry)
+    return None
+
+def sample_backend(pid):
+    """RSS in MB, open file descriptors and MongoDB connections right now"""
+    sample = {"rss_mb": None, "fds": None, "mongo_connections": None}
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    sample["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+        sample["fds"] = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        pass
+    try:
+        store = get_fixture_store()
+        if not store.in_memory:
+            sample["mongo_connections"] = store.db.command("serverStatus")["connections"]["current"]
+    except Exception:
+        pass
+    return sample
+
+def sustained_growth(values, min_increase):
+    """Whether values climb across every third of the run by at least min_increase overall"""
+    if len(values) < 6:
+        return False
+    third = len(values) // 3
+    medians = [statistics.median(values[index * third:(index + 1) * third]) for index in range(3)]
+    return medians[0] < medians[1] < medians[2] and medians[2] - medians[0] >= min_increase
+
+def soak_iteration(steps, latencies, lock):
+    """One OAuth lifecycle: seed a session, use it, log out, then delete the user"""
+    suffix = fixture_suffix()
+    user_id = f"test-user-soak-{suffix}"
+    token = f"test_session_soak_{suffix}"
+    store = get_fixture_store()
+    store.seed(
+        users=[make_test_user(user_id, f"test.user.soak.{suffix}@example.com", "Test User Soak")],
+        sessions=[make_test_session(user_id, token)],
+    )
+    
+    try:
+        for step in steps:
+            if step == "me-header":
+                response = api.get(f"{API_BASE}/auth/me", headers={"Authorization": f"Bearer {token}"})
+            elif step == "me-cookie":
+                response = api.get(f"{API_BASE}/auth/me", cookies={"session_token": token})
+            else:
+                response = api.post(f"{API_BASE}/auth/logout", headers={"Authorization": f"Bearer {token}"})
+            with lock:
+                latencies.setdefault(step, deque(maxlen=SOAK_LATENCY_WINDOW)).append(response.timing.total)
+            if response.status_code != 200:
+                raise RuntimeError(f"{step} returned {response.status_code}")
+    finally:
+        # Hours of lifecycles must not pile up users until the final cleanup
+        store.remove([user_id])
+
+def run_soak(duration, interval, concurrency, steps, backend_pid):
+    """Loop the OAuth lifecycle and fail if backend memory, fds or Mongo connections keep growing"""
+    print("🫧 Starting NotePilot Backend Soak Test")
+    print("=" * 50)
+    print(f"   {duration:.0f}s, concurrency {concurrency}, steps {', '.join(steps)}, "
+          f"sampling backend pid {backend_pid} every {interval:.0f}s")
+    
+    deadline = time.perf_counter() + duration
+    latencies = {}
+    counters = {"iterations": 0, "errors": 0}
+    api.record_timings = False
+    lock = threading.Lock()
+    samples = []
+    
+    def worker():
+        while time.perf_counter() < deadline:
+            try:
+                soak_iteration(steps, latencies, lock)
+                with lock:
+                    counters["iterations"] += 1
+            except Exception as e:
+                with lock:
+                    counters["errors"] += 1
+                    if counters["errors"] <= 5:
+                        print(f"   ⚠️  Iteration failed: {e}")
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        workers = [pool.submit(worker) for _ in range(concurrency)]
+        while not all(future.done() for future in workers):
+            sample = sample_backend(backend_pid)
+            sample["elapsed"] = time.perf_counter() - start
+            samples.append(sample)
+            with lock:
+                iterations = counters["iterations"]
+                recent = {step: sorted(values) for step, values in latencies.items()}
+            p95 = "  ".join(f"{step}={percentile(values, 95) * 1000:.1f}ms" for step, values in recent.items())
+            print(f"   ⏱️  {sample['elapsed']:7.0f}s  iterations={iterations}  rss={sample['rss_mb']}MB  "
+                  f"fds={sample['fds']}  mongo_conns={sample['mongo_connections']}  p95 {p95}")
+            wait(workers, timeout=interval)
+    
+    cleanup_test_data()
+    
+    print("\n" + "=" * 50)
+    print("📊 SOAK RESULTS")
+    print("=" * 50)
+    print(f"   {counters['iterations']} lifecycles, {counters['errors']} errors in "
+          f"{time.perf_counter() - start:.0f}s")
+    
+    # Skip warm-up: caches, pools and allocator arenas fill during the first samples
+    steady = samples[max(1, len(samples) // 10):]
+    leaks = []
+    for metric, threshold in SOAK_LEAK_THRESHOLDS.items():
+        values = [sample[metric] for sample in steady if sample[metric] is not None]
+        if not values:
+            print(f"   ⚠️  {metric}: not available")
+            continue
+        growing = sustained_growth(values, threshold)
+        status = "❌ GROWING" if growing else "✅ stable"
+        print(f"   {status} {metric}: {values[0]:.1f} -> {values[-1]:.1f} (max {max(values):.1f})")
+        if growing:
+            leaks.append(metric)
+    
+    if leaks:
+        print(f"⚠️  Unbounded growth in: {', '.join(leaks)}")
+        return False
+    if counters["errors"]:
+        print("⚠️  Soak finished with errors")
+        return False
+    print("🎉 Soak test PASSED!")
+    return True
+
+# ============ RECORD AND REPLAY ============
+
+DEFAULT_TRACE_PATH = "traffic_trace.jsonl"
+UUID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+# Path segments that are ids: UUIDs, hex digests (study pack jobs) and opaque profile ids
+ID_SEGMENT_PATTERN = re.compile(
+    rf"(?<=/)(?:{UUID_PATTERN.pattern}|[0-9a-f]{{16,}})(?=/|$)|(?<=/debug/profile/)[^/]+(?=/)"
+)
+
+def response_shape(response, streamed=False):
+    """Comparable summary of a response body that ignores ids and timestamps"""
+    if streamed:
+        return response.headers.get("Content-Type", "").split(";")[0]
+    try:
+        body = response.json()
+    except ValueError:
+        return response.headers.get("Content-Type", "").split(";")[0]
+    if isinstance(body, dict):
+        return sorted(body)
+    return type(body).__name__
+
+def issued_values(method, response, streamed=False):
+    """Ids and session tokens a write handed out, in response order
+
+    A streamed body is left for the caller to consume, so only cookies count.
+    """
+    if method == "GET":
+        return []
+    values = []
+    token = response.cookies.get("session_token")
+    if token:
+        values.append(token)
+    if streamed:
+        return values
+    try:
+        body = response.json()
+    except ValueError:
+        return values
+    items = body if isinstance(body, list) else [body]
+    values.extend(item["id"] for item in items if isinstance(item, dict) and "id" in item)
+    return values
+
+def endpoint_key(method, path):
+    """Group requests by route, e.g. GET /status/{id}"""
+    return f"{method} {ID_SEGMENT_PATTERN.sub('{id}', path)}"
+
+class TraceRecorder:
+    """Writes every request sent to API_BASE through `api`, and every seeded session, as JSONL"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w")
+        self._lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.count = 0
+
+    def write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            if entry["kind"] == "request":
+                self.count += 1
+
+    def record_sessions(self, sessions):
+        sent_at = time.perf_counter() - self.start
+        now = datetime.now(timezone.utc)
+        for session in sessions:
+            expires_at = session["expires_at"]
+            self.write({
+                "t": round(sent_at, 6),
+                "kind": "session",
+                "user_id": session["user_id"],
+                "token": session["session_token"],
+                "expires_in": (expires_at - now).total_seconds(),
+            })
+
+    def record(self, method, url, kwargs, response, sent_at):
+        headers = dict(kwargs.get("headers") or {})
+        cookies = kwargs.get("cookies") or {}
+        auth, token = "none", None
+        if headers.get("Authorization", "").startswith("Bearer "):
+            auth, token = "header", headers.pop("Authorization")[len("Bearer "):]
+        elif "session_token" in cookies:
+            auth, token = "cookie", cookies["session_token"]
+        headers.pop("Content-Type", None)
+        
+        self.write({
+            "t": round(sent_at - self.start, 6),
+            "kind": "request",
+            "method": method,
+            "path": url[len(API_BASE):],
+            "params": kwargs.get("params"),
+            "auth": auth,
+            "token": token,
+            "headers": headers or None,
+            "json": kwargs.get("json"),
+            "data": kwargs.get("data"),
+            "stream": kwargs.get("stream", False),
+            "status": response.status_code,
+            "shape": response_shape(response, kwargs.get("stream", False)),
+            "issued": issued_values(method, response, kwargs.get("stream", False)),
+        })
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def load_trace(path):
+    """Read a recorded trace in arrival order"""
+    with open(path, "r") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return sorted(entries, key=lambda entry: entry["t"])
+
+def seed_replay_sessions(sessions, speed):
+    """Seed fresh users and sessions for the recorded ones, returning {recorded token: new token}"""
+    suffix = fixture_suffix()
+    user_ids = {}
+    users = []
+    docs = []
+    token_map = {}
+    
+    for index, session in enumerate(sessions):
+        if session["user_id"] not in user_ids:
+            user_id = f"test-user-replay-{suffix}-{len(user_ids)}"
+            user_ids[session["user_id"]] = user_id
+            users.append(make_test_user(user_id, f"test.user.replay.{suffix}.{len(users)}@example.com",
+                                        "Test User Replay"))
+        # Scale the recorded expiry with the replay clock; at max speed keep it as recorded
+        if speed:
+            expires_in = (session["t"] + session["expires_in"]) / speed
+        else:
+            expires_in = session["expires_in"]
+        token = f"test_session_replay_{suffix}_{index}"
+        docs.append(make_test_session(user_ids[session["user_id"]], token,
+                                      timedelta(seconds=expires_in)))
+        token_map[session["token"]] = token
+    
+    get_fixture_store().seed(users=users, sessions=docs)
+    return token_map
+
+def run_replay(path, speed, concurrency):
+    """Replay a recorded trace and report per-endpoint latency and response diffs
+
+    speed 1 keeps the recorded timing, N compresses it N times and 0 sends as
+    fast as possible. Requests start in recorded order with up to
+    `concurrency` in flight; a request that uses an id or session handed out
+    by an earlier write waits for that write's replayed value.
+    """
+    print("🔁 Starting NotePilot Traffic Replay")
+    print("=" * 50)
+    
+    trace = load_trace(path)
+    entries = [entry for entry in trace if entry["kind"] == "request"]
+    sessions = [entry for entry in trace if entry["kind"] == "session"]
+    pace = f"{speed}x" if speed else "max speed"
+    print(f"   {len(entries)} requests and {len(sessions)} sessions from {path} "
+          f"at {pace}, concurrency {concurrency}")
+    
+    if not entries:
+        print("   ❌ Trace has no requests")
+        return False
+    
+    token_map = {}
+    if sessions:
+        try:
+            token_map = seed_replay_sessions(sessions, speed)
+        except Exception as e:
+            print(f"   ❌ Failed to seed replay sessions: {e}")
+            return False
+    
+    issued_map = {}
+    issued_ready = {value: threading.Event() for entry in entries for value in entry.get("issued", ())}
+    latencies = {}
+    diffs = []
+    failures = {}
+    lock = threading.Lock()
+    
+    def resolve(value):
+        if value in issued_ready:
+            issued_ready[value].wait(timeout=30)
+        with lock:
+            return issued_map.get(value, token_map.get(value, value))
+    
+    def send_one(entry):
+        request_path = entry["path"]
+        for value in UUID_PATTERN.findall(request_path):
+            request_path = request_path.replace(value, resolve(value))
+        
+        kwargs = {"timeout": 30}
+        if entry["params"]:
+            kwargs["params"] = entry["params"]
+        if entry["json"] is not None:
+            kwargs["json"] = entry["json"]
+        headers = dict(entry["headers"] or {})
+        if entry["data"] is not None:
+            kwargs["data"] = entry["data"]
+            headers["Content-Type"] = "application/json"
+        if entry["auth"] == "header":
+            headers["Authorization"] = f"Bearer {resolve(entry['token'])}"
+        elif entry["auth"] == "cookie":
+            kwargs["cookies"] = {"session_token": resolve(entry["token"])}
+        if headers:
+            kwargs["headers"] = headers
+        
+        key = endpoint_key(entry["method"], entry["path"])
+        start = time.perf_counter()
+        try:
+            response = api.request(entry["method"], f"{API_BASE}{request_path}", **kwargs)
+        except requests.RequestException as e:
+            response = None
+            difference = f"request failed: {e}"
+        latency = time.perf_counter() - start
+        
+        with lock:
+            if response is not None:
+                latencies.setdefault(key, []).append(latency)
+                issued_map.update(zip(entry["issued"], issued_values(entry["method"], response, entry["stream"])))
+                shape = response_shape(response, entry["stream"])
+                if response.status_code != entry["status"]:
+                    difference = f"status {entry['status']} -> {response.status_code}"
+                elif shape != entry["shape"]:
+                    difference = f"body {entry['shape']} -> {shape}"
+                else:
+                    difference = None
+            if difference:
+                failures[key] = failures.get(key, 0) + 1
+                diffs.append((entry, difference))
+    
+    def crashed(entry, error):
+        key = endpoint_key(entry.get("method"), entry.get("path", ""))
+        with lock:
+            failures[key] = failures.get(key, 0) + 1
+            diffs.append((entry, f"replay crashed: {error!r}"))
+    
+    def replay_one(entry):
+        try:
+            send_one(entry)
+        except Exception as e:
+            crashed(entry, e)
+        finally:
+            # Never leave a dependent request waiting on a write that crashed
+            for value in entry.get("issued", ()):
+                issued_ready[value].set()
+    
+    futures = []
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for entry in entries:
+                if speed:
+                    delay = start + entry["t"] / speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append((entry, pool.submit(replay_one, entry)))
+        for entry, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                crashed(entry, e)
+    finally:
+        cleanup_test_data()
+    elapsed = time.perf_counter() - start
+    
+    print("\n" + "=" * 50)
+    print("📊 REPLAY RESULTS")
+    print("=" * 50)
+    for key in sorted(latencies):
+        print_bench_result(BenchResult(key, sorted(latencies[key]), failures.get(key, 0), elapsed))
+    
+    recorded_span = entries[-1]["t"]
+    print(f"\n⏱️  Replayed {recorded_span:.2f}s of traffic in {elapsed:.2f}s")
+    
+    if diffs:
+        print(f"\n⚠️  {len(diffs)} responses differ from the recording:")
+        for entry, difference in diffs[:20]:
+            print(f"   {endpoint_key(entry.get('method'), entry.get('path', ''))} "
+                  f"at {entry['t']:.3f}s: {difference}")
+        return False
+    
+    print("\n✅ Every response matched the recording")
+    return True
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NotePilot backend API tests")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="number of tests to run concurrently")
+    parser.add_argument("--serial", action="store_true",
+                        help="run tests one at a time (same as --workers 1)")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="split the tests across this many processes, each with its own "
+                             "fixture namespace (0: one per CPU core)")
+    # Set by run_sharded() on the processes it starts
+    parser.add_argument("--shard", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--shard-output", help=argparse.SUPPRESS)
+    
+    parser.add_argument("--auth-stub", metavar="URL",
+                        help="the backend's auth upstream is auth_stub_server.py at URL; "
+                             "enables the successful session-exchange test and benchmark")
+    parser.add_argument("--generator-stub", metavar="URL",
+                        help="the backend's study pack generator and chat model are "
+                             "study_generator_stub.py at URL; lets the study pack and chat tests "
+                             "inspect model traffic")
+    
+    bench = parser.add_argument_group("benchmark mode")
+    bench.add_argument("--bench", action="store_true",
+                       help="load the API endpoints instead of running the tests")
+    bench.add_argument("--endpoint", action="append", choices=list(BENCH_ENDPOINTS),
+                       help="endpoint to benchmark (repeatable, default: all)")
+    bench.add_argument("--concurrency", type=int, default=10,
+                       help="concurrent clients per endpoint")
+    bench.add_argument("--duration", type=float, default=10.0,
+                       help="seconds to drive each endpoint")
+    bench.add_argument("--requests", type=int, default=0,
+                       help="requests per endpoint (overrides --duration)")
+    bench.add_argument("--sessions", type=int, default=BENCH_DEFAULT_SESSIONS,
+                       help="sessions to seed for the auth and logout benchmarks")
+    bench.add_argument("--batch-size", type=int, default=BENCH_BATCH_SIZE,
+                       help="status checks per POST /api/status/batch request")
+    
+    serialization = parser.add_argument_group("serialization benchmark")
+    serialization.add_argument("--serialization-bench", action="store_true",
+                               help="compare status check response serialization paths in-process")
+    serialization.add_argument("--sizes", type=int, nargs="+", default=list(SERIALIZATION_SIZES),
+                               metavar="N", help="status check counts to serialize")
+    
+    durability = parser.add_argument_group("durability check")
+    durability.add_argument("--durability", action="store_true",
+                            help="restart the backend during a write burst and check for lost writes")
+    durability.add_argument("--restart-cmd", default="supervisorctl restart backend",
+                            help="shell command that gracefully restarts the backend")
+    durability.add_argument("--writes", type=int, default=500,
+                            help="POST /api/status requests in the burst")
+    
+    soak = parser.add_argument_group("soak test")
+    soak.add_argument("--soak", action="store_true",
+                      help="loop the OAuth lifecycle and watch the backend for leaks")
+    soak.add_argument("--soak-duration", type=float, default=3600.0,
+                      help="seconds to keep the soak running")
+    soak.add_argument("--sample-interval", type=float, default=30.0,
+                      help="seconds between backend resource samples")
+    soak.add_argument("--soak-step", action="append", choices=SOAK_STEPS,
+                      help="lifecycle step to exercise (repeatable, default: all) to isolate a leak")
+    soak.add_argument("--backend-pid", type=int, help="backend process to sample")
+    soak.add_argument("--backend-match", default="uvicorn",
+                      help="find the backend process by command line when --backend-pid is not given")
+    
+    gate = parser.add_argument_group("performance gate")
+    gate.add_argument("--results", default=DEFAULT_RESULTS_PATH, metavar="PATH",
+                      help="where to write this run's machine-readable results")
+    gate.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, metavar="PATH",
+                      help="stored results to compare against")
+    gate.add_argument("--threshold", type=float, default=0.2,
+                      help="allowed p95 latency / DB round-trip growth as a fraction")
+    gate.add_argument("--update-baseline", action="store_true",
+                      help="store this run's results as the new baseline if every test passed")
+    gate.add_argument("--junit", metavar="PATH", help="also write a JUnit XML report")
+    
+    profile = parser.add_argument_group("profiling")
+    profile.add_argument("--profile", choices=PROFILE_MODES,
+                         help="profile the backend during every test or benchmark phase "
+                              "(needs DEBUG_PROFILE_TOKEN)")
+    profile.add_argument("--profile-route", metavar="ROUTE",
+                         help='only profile requests to this route, e.g. "GET /api/auth/me"')
+    profile.add_argument("--profile-dir", metavar="PATH",
+                         help="where to write profiles (default: profiles/ next to --results)")
+    
+    trace = parser.add_argument_group("record and replay")
+    trace.add_argument("--record", nargs="?", const=DEFAULT_TRACE_PATH, metavar="PATH",
+                       help=f"write every API request of this run to a trace (default {DEFAULT_TRACE_PATH})")
+    trace.add_argument("--replay", metavar="PATH",
+                       help="replay a recorded trace instead of running the tests")
+    trace.add_argument("--speed", type=float, default=1.0,
+                       help="replay speed multiplier, 0 for as fast as possible")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    AUTH_STUB_URL = args.auth_stub
+    GENERATOR_STUB_URL = args.generator_stub
+    PROFILE_MODE = args.profile
+    PROFILE_ROUTE = args.profile_route
+    PROFILE_DIR = args.profile_dir or os.path.join(os.path.dirname(args.results), "profiles")
+    BENCH_BATCH_SIZE = max(1, args.batch_size)
+    if not args.serialization_bench:
+        resolve_backend_url()
+    if args.record:
+        api.recorder = TraceRecorder(args.record)
+    if args.serialization_bench:
+        success = run_serialization_bench(args.sizes)
+    elif args.shard is not None:
+        success = run_shard(shard_tests(TESTS, args.shards)[args.shard], max(1, args.workers), args.shard_output)
+    elif args.soak:
+        backend_pid = args.backend_pid or find_backend_pid(args.backend_match)
+        if backend_pid is None:
+            print(f"❌ No backend process matching '{args.backend_match}'; pass --backend-pid")
+            sys.exit(1)
+        success = run_soak(
+            args.soak_duration,
+            max(1.0, args.sample_interval),
+            max(1, args.concurrency),
+            args.soak_step or SOAK_STEPS,
+            backend_pid,
+        )
+    elif args.replay:
+        success = run_replay(args.replay, max(0.0, args.speed), max(1, args.concurrency))
+    elif args.durability:
+        success = run_durability_check(args.restart_cmd, args.writes, max(1, args.concurrency))
+    elif args.bench:
+        success = run_benchmarks(
+            args.endpoint or list(BENCH_ENDPOINTS),
+            max(1, args.concurrency),
+            args.duration,
+            args.requests,
+            args.sessions,
+        )
+    else:
+        success = run_all_tests(
+            workers=1 if args.serial else max(1, args.workers),
+            results_path=args.results,
+            baseline_path=args.baseline,
+            threshold=args.threshold,
+            junit_path=args.junit,
+            update_baseline=args.update_baseline,
+            shards=args.shards if args.shards > 0 else os.cpu_count() or 1,
+        )
+    if api.recorder:
+        api.recorder.close()
+        print(f"📼 Recorded {api.recorder.count} requests to {api.recorder.path}")
+    sys.exit(0 if success else 1)
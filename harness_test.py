@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the backend_test.py harness itself
+Runs offline against local sockets; never part of the deploy gate
+"""
+
+import socket
+import ssl
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import backend_test
+
+class HangUpServer:
+    """Accepts one connection and closes it at once, failing any TLS handshake"""
+
+    def __init__(self):
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.address = self.listener.getsockname()
+        threading.Thread(target=self.hang_up, daemon=True).start()
+
+    def hang_up(self):
+        connection, _ = self.listener.accept()
+        connection.close()
+
+    def close(self):
+        self.listener.close()
+
+class ConnectTimingTest(unittest.TestCase):
+    def setUp(self):
+        backend_test._connect_clock.seconds = 0.0
+        backend_test._connect_clock.count = 0
+
+    def connect(self, pool_class):
+        server = HangUpServer()
+        self.addCleanup(server.close)
+        host, port = server.address
+        connection = pool_class(host, port, timeout=5)._new_conn()
+        try:
+            connection.connect()
+        except (ssl.SSLError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def test_https_connect_is_timed(self):
+        self.connect(backend_test.TimedHTTPSConnectionPool)
+        self.assertEqual(backend_test._connect_clock.count, 1)
+        self.assertGreater(backend_test._connect_clock.seconds, 0.0)
+
+    def test_http_connect_is_timed(self):
+        self.connect(backend_test.TimedHTTPConnectionPool)
+        self.assertEqual(backend_test._connect_clock.count, 1)
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        self.send_response(429)
+        self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class GetRetryTest(unittest.TestCase):
+    def test_429_reaches_the_caller(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address
+
+        client = backend_test.ApiClient()
+        self.addCleanup(client.session().close)
+        response = client.get(f"http://{host}:{port}/api/auth/me")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(RateLimitedHandler.hits, 1)
+
+if __name__ == "__main__":
+    unittest.main()
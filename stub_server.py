@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Shared scaffolding for the local upstream stand-ins
+Fault injection settings, thread-safe counters, a JSON handler with /stats routes,
+and the background server and command line every stub runs on
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+STATS_PATH = "/stats"
+
+class StubConfig:
+    """Fault injection settings, adjustable while the stub is running"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, timeout_rate=0.0, hang=30.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+
+    def delay(self):
+        """Seconds to wait before answering one request"""
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+class StubCounters:
+    """Thread-safe counters; subclasses name them and their starting values in initial()"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def initial(self):
+        return {}
+
+    def reset(self):
+        with self._lock:
+            for name, value in self.initial().items():
+                setattr(self, name, value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: dict(getattr(self, name)) if isinstance(value, Counter) else getattr(self, name)
+                for name, value in self.initial().items()
+            }
+
+class StubHandler(BaseHTTPRequestHandler):
+    """JSON handler serving GET /stats and POST /stats/reset
+
+    Subclasses map their own paths to method names in get_routes and post_routes.
+    """
+    protocol_version = "HTTP/1.1"
+    config = None
+    stats = None
+    verbose = False
+    get_routes = {}
+    post_routes = {}
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == STATS_PATH:
+            self.send_json(200, self.stats.snapshot())
+        elif path in self.get_routes:
+            getattr(self, self.get_routes[path])()
+        else:
+            self.send_json(404, {"detail": "Not Found"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == f"{STATS_PATH}/reset":
+            self.stats.reset()
+            self.send_json(200, {"message": "Stats reset"})
+        elif path in self.post_routes:
+            getattr(self, self.post_routes[path])()
+        else:
+            self.send_json(404, {"detail": "Not Found"})
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+def start_stub_server(handler, stats, host="127.0.0.1", port=0, config=None, verbose=False,
+                      server_class=ThreadingHTTPServer, **attributes):
+    """Serve a bound copy of `handler` on a background thread and return the server
+
+    The bound address is server.server_address; stop it with server.shutdown().
+    Extra keyword arguments become class attributes of the bound handler.
+    """
+    bound = type(f"Bound{handler.__name__}", (handler,), {
+        "config": config or StubConfig(),
+        "stats": stats,
+        "verbose": verbose,
+        **attributes,
+    })
+    server = server_class((host, port), bound)
+    server.daemon_threads = True
+    server.config = bound.config
+    server.stats = bound.stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def stub_arg_parser(description, port, latency, jitter, latency_help):
+    """Command line options every stub takes; the stub adds its own before parsing"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument("--latency", type=float, default=latency, help=latency_help)
+    parser.add_argument("--jitter", type=float, default=jitter,
+                        help="uniform +/- jitter in milliseconds")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of requests answered with 500")
+    parser.add_argument("--seed", type=int, help="seed for reproducible fault injection")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser
+
+def serve_until_interrupted(server):
+    """Block until Ctrl-C, then stop the server"""
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
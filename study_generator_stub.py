@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the AI model behind study packs and NotePilotChat
+Builds deterministic summaries, key terms, flashcards and quizzes from the input text,
+and streams deterministic chat replies token by token as Server-Sent Events,
+with configurable latency, jitter and error rate
+"""
+
+import hashlib
+import json
+import random
+import re
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer
+
+from stub_server import (
+    StubConfig,
+    StubCounters,
+    StubHandler,
+    serve_until_interrupted,
+    start_stub_server,
+    stub_arg_parser,
+)
+
+GENERATE_PATH = "/generate"
+CHAT_PATH = "/chat"
+# Words in every streamed chat reply
+CHAT_REPLY_TOKENS = 40
+
+class GeneratorStats(StubCounters):
+    """Thread-safe counters describing the generations and chat streams the stub has served"""
+
+    def initial(self):
+        return {
+            "generations": 0,
+            "errors": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "by_digest": Counter(),
+            "streams": 0,
+            "streams_in_flight": 0,
+            "max_streams_in_flight": 0,
+            "cancelled": 0,
+        }
+
+    def started(self, digest):
+        with self._lock:
+            self.generations += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.by_digest[digest] += 1
+
+    def finished(self, failed):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.errors += 1
+
+    def stream_started(self):
+        with self._lock:
+            self.streams += 1
+            self.streams_in_flight += 1
+            self.max_streams_in_flight = max(self.max_streams_in_flight, self.streams_in_flight)
+
+    def stream_finished(self, cancelled):
+        with self._lock:
+            self.streams_in_flight -= 1
+            if cancelled:
+                self.cancelled += 1
+
+def text_digest(text):
+    """Short digest of the text a generation was asked for, as counted in /stats"""
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+def study_pack(text, options):
+    """Deterministic study pack for `text`; options choose the sections and their sizes"""
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if s.strip()] or [text.strip()]
+    words = Counter(word.lower() for word in re.findall(r"[A-Za-z][A-Za-z-]{4,}", text))
+    terms = [word for word, _ in words.most_common(options.get("key_terms", 5))]
+
+    pack = {}
+    if options.get("summary", True):
+        pack["summary"] = " ".join(sentences[:2])
+    if options.get("key_terms"):
+        pack["key_terms"] = terms
+    if options.get("flashcards"):
+        pack["flashcards"] = [
+            {"front": f"What does the text say about {term}?",
+             "back": next((s for s in sentences if term in s.lower()), sentences[0])}
+            for term in terms[:options["flashcards"]]
+        ]
+    if options.get("quiz"):
+        pack["quiz"] = [
+            {"question": f"Which term fits: {sentence[:80]}",
+             "choices": terms[:4],
+             "answer": 0}
+            for sentence in sentences[:options["quiz"]]
+        ]
+    return pack
+
+def chat_reply(messages):
+    """Deterministic reply to the last message, CHAT_REPLY_TOKENS words long"""
+    prompt = messages[-1].get("content", "") if messages else ""
+    words = re.findall(r"\w+", prompt) or ["notes"]
+    seed = int(hashlib.sha256(prompt.encode()).hexdigest(), 16)
+    return [words[(seed + index) % len(words)] for index in range(CHAT_REPLY_TOKENS)]
+
+class GeneratorStubHandler(StubHandler):
+    post_routes = {GENERATE_PATH: "generate", CHAT_PATH: "chat"}
+    # Seconds between streamed chat tokens; config.delay() is the time to the first one
+    token_delay = 0.03
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return None
+
+    def generate(self):
+        body = self.read_json()
+        if not isinstance(body, dict) or not isinstance(body.get("text"), str):
+            self.send_json(422, {"detail": "text is required"})
+            return
+
+        self.stats.started(text_digest(body["text"]))
+        failed = False
+        try:
+            time.sleep(self.config.delay())
+            if random.random() < self.config.error_rate:
+                failed = True
+                self.send_json(500, {"detail": "Injected generator error"})
+            else:
+                self.send_json(200, study_pack(body["text"], body.get("options") or {}))
+        finally:
+            self.stats.finished(failed)
+
+    def chat(self):
+        body = self.read_json()
+        if not isinstance(body, dict) or not isinstance(body.get("messages"), list):
+            self.send_json(422, {"detail": "messages are required"})
+            return
+
+        self.stats.stream_started()
+        cancelled = False
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            # No Content-Length: the stream ends when the connection closes
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            time.sleep(self.config.delay())
+            for index, word in enumerate(chat_reply(body["messages"])):
+                if index:
+                    time.sleep(self.token_delay)
+                self.wfile.write(f"data: {json.dumps({'token': word + ' '})}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The backend hung up mid-reply: it cancelled the chat
+            cancelled = True
+        finally:
+            self.stats.stream_finished(cancelled)
+
+class GeneratorStubServer(ThreadingHTTPServer):
+    # Hundreds of chat streams open at once; the default backlog of 5 would drop them
+    request_queue_size = 1024
+
+def start_stub(host="127.0.0.1", port=0, config=None, verbose=False, token_delay=0.03):
+    """Start the stub on a background thread and return the server
+
+    The bound address is server.server_address; stop it with server.shutdown().
+    """
+    return start_stub_server(GeneratorStubHandler, GeneratorStats(), host, port, config, verbose,
+                             server_class=GeneratorStubServer, token_delay=token_delay)
+
+def parse_args(argv=None):
+    parser = stub_arg_parser("Local study pack generator stand-in", port=8091, latency=1000.0, jitter=200.0,
+                             latency_help="mean generation time in milliseconds")
+    parser.add_argument("--token-delay", type=float, default=30.0,
+                        help="milliseconds between streamed chat tokens")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    config = StubConfig(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+    )
+    server = start_stub(args.host, args.port, config, args.verbose, args.token_delay / 1000)
+    host, port = server.server_address
+    print(f"📚 Generator stub listening on http://{host}:{port}{GENERATE_PATH} and {CHAT_PATH}")
+    print(f"   latency {args.latency}±{args.jitter}ms, error rate {args.error_rate}, "
+          f"{args.token_delay}ms per chat token")
+
+    serve_until_interrupted(server)